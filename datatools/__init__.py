@@ -1 +1,14 @@
-__all__ = ['immport', 'pubmed', 'redcap', 'utils']
\ No newline at end of file
+""" Submodules and the repository clients are imported on first use, e.g. `from datatools import redcap` """
+
+from datatools.utils.lazy import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=["cli", "file_processing", "helpers", "repositories", "utils"],
+    attributes={
+        "bioimage": "datatools.repositories.bioimage",
+        "immport": "datatools.repositories.immport",
+        "pubmed": "datatools.repositories.pubmed",
+        "redcap": "datatools.repositories.redcap",
+    },
+)
@@ -0,0 +1,6 @@
+""" `python -m datatools`, same as the `datatools` command """
+
+import sys
+from datatools.cli import main
+
+sys.exit(main())
@@ -0,0 +1,290 @@
+""" Command line interface for the datatools workflows
+
+Example:
+    datatools harvest ./images -o ./harvest
+    datatools geo 200012345 -o samples.csv
+    datatools zooma "lung tissue" "CD4+ T cell" --pem ./ebi.pem -o annotations.csv
+    datatools redcap-export STUDY-001 -o records.csv         # token from REDCAP_TOKEN
+    datatools immport-validate template.xlsx --package my_package
+
+A warm process keeps the imports, HTTP sessions and ImmPort login between jobs:
+    datatools serve --socket /tmp/datatools.sock &
+    datatools --socket /tmp/datatools.sock harvest ./images -o ./harvest
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+from pathlib import Path
+
+default_socket = str(Path.home() / ".datatools.sock")
+default_zooma_cache = str(Path.home() / ".cache" / "datatools" / "zooma.sqlite")
+
+# loaded when the daemon starts instead of by its first job
+warm_modules = [
+    "pandas", "numpy", "pyarrow", "requests", "h5py", "readlif.reader", "bs4", "Bio.Entrez", "tqdm",
+    "datatools.file_processing.microscopy", "datatools.helpers.geo", "datatools.utils.zooma",
+    "datatools.repositories.redcap", "datatools.repositories.immport",
+]
+
+
+def write_table(df, output=None):
+    """ Write a table to a csv, or print it """
+    if output is None:
+        print(df.to_string())
+    else:
+        df.to_csv(output, index=False)
+        print(f"Wrote {len(df)} rows: {output}")
+
+
+def harvest(args, clients: dict):
+    from datatools.file_processing import microscopy
+
+    md_df, channels_df, errors_df = microscopy.harvest_directory(
+        args.root,
+        workers=args.workers,
+        progress=not args.no_progress,
+        metadata_only=not args.full,
+        cache_dir=args.cache_dir,
+    )
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    write_table(md_df, output / "metadata.csv")
+    write_table(channels_df, output / "channels.csv")
+    write_table(errors_df, output / "errors.csv")
+    return 1 if len(errors_df) > 0 and args.strict else 0
+
+
+def geo_samples(args, clients: dict):
+    from datatools.helpers import geo
+
+    samples_df = geo.get_samples(args.gds_id)
+    if args.pages:
+        sample_pages_df, _ = geo.get_sample_pages(samples_df)
+        samples_df = geo.process_sample_pages(sample_pages_df)
+    write_table(samples_df, args.output)
+    return 0
+
+
+def zooma_annotate(args, clients: dict):
+    import pandas as pd
+    from datatools.utils import zooma
+
+    cache = None if args.no_cache else args.cache
+    key = ("zooma", args.pem, cache, args.ttl)
+    if key not in clients:
+        clients[key] = zooma.zooma(args.pem, cache=cache, ttl=args.ttl)
+    client = clients[key]
+
+    results = []
+    for term in args.terms:
+        annotations = client.get_annotations(term)
+        if annotations is None:
+            print(f"No annotations for: {term}")
+            continue
+        results.append(annotations[1].assign(term=term))
+    write_table(pd.concat(results, ignore_index=True) if results else pd.DataFrame(), args.output)
+    if client.cache is not None:
+        print(f"Cache: {client.cache.stats()}")
+    return 0 if results else 1
+
+
+def redcap_export(args, clients: dict):
+    from datatools.repositories import redcap
+
+    token = args.token or os.environ.get("REDCAP_TOKEN")
+    if not token:
+        print("A REDCap API token is needed: --token or the REDCAP_TOKEN environment variable")
+        return 2
+    worker = redcap.redcap_worker(token)
+    write_table(worker.get_study_records(args.study_id), args.output)
+    return 0
+
+
+def immport_validate(args, clients: dict):
+    from datatools.repositories import immport
+
+    key = ("immport", os.path.abspath(args.config))
+    if key not in clients:
+        clients[key] = immport.immport_queries(immport.load_config(key[1]))
+    try:
+        result = clients[key].validate_file(args.file_path, args.package)
+    except Exception:
+        clients.pop(key, None) # log in again next time, e.g. after the token expired
+        raise
+    print(result if isinstance(result, str) else json.dumps(result, indent=2, default=str))
+    return 0 if result == "Completed Validation" else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="datatools", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=os.environ.get("DATATOOLS_SOCKET"),
+                        help="run the command in the `datatools serve` process listening here (or DATATOOLS_SOCKET)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("harvest", help="microscopy metadata and channels from every .lif and .ims file under a directory")
+    p.add_argument("root", help="directory to search")
+    p.add_argument("-o", "--output", default=".", help="directory for metadata.csv, channels.csv and errors.csv")
+    p.add_argument("--workers", type=int, default=None, help="worker processes, 1 runs in this process")
+    p.add_argument("--full", action="store_true", help="index whole .lif files instead of only the XML header")
+    p.add_argument("--cache-dir", default=None, help="reuse results for unchanged files from this cache")
+    p.add_argument("--no-progress", action="store_true")
+    p.add_argument("--strict", action="store_true", help="exit with 1 if any file could not be read")
+    p.set_defaults(func=harvest)
+
+    p = subparsers.add_parser("geo", help="samples of a GEO dataset")
+    p.add_argument("gds_id")
+    p.add_argument("-o", "--output", default=None, help="csv to write, prints the table otherwise")
+    p.add_argument("--pages", action="store_true", help="also fetch each sample page for the biosample fields (slow)")
+    p.set_defaults(func=geo_samples)
+
+    p = subparsers.add_parser("zooma", help="ontology annotations for terms from the Zooma API")
+    p.add_argument("terms", nargs="+")
+    p.add_argument("--pem", default=None, help="CA bundle for the EBI certificate")
+    p.add_argument("--cache", default=os.environ.get("DATATOOLS_ZOOMA_CACHE", default_zooma_cache),
+                   help="SQLite cache of earlier lookups (or DATATOOLS_ZOOMA_CACHE)")
+    p.add_argument("--no-cache", action="store_true", help="always call the API")
+    p.add_argument("--ttl", type=float, default=30 * 24 * 3600, help="seconds a cached lookup stays valid")
+    p.add_argument("-o", "--output", default=None, help="csv to write, prints the table otherwise")
+    p.set_defaults(func=zooma_annotate)
+
+    p = subparsers.add_parser("redcap-export", help="records of a study from REDCap")
+    p.add_argument("study_id")
+    p.add_argument("--token", default=None, help="API token, defaults to the REDCAP_TOKEN environment variable")
+    p.add_argument("-o", "--output", default=None, help="csv to write, prints the table otherwise")
+    p.set_defaults(func=redcap_export)
+
+    p = subparsers.add_parser("immport-validate", help="validate a template with the ImmPort upload API")
+    p.add_argument("file_path")
+    p.add_argument("--package", required=True, help="package name for the upload")
+    p.add_argument("--config", default=".env.secrets", help="dotenv file with the ImmPort username and password")
+    p.set_defaults(func=immport_validate)
+
+    p = subparsers.add_parser("serve", help="keep a warm process that runs commands sent over a Unix socket")
+    p.add_argument("--socket", default=argparse.SUPPRESS, help=f"socket to listen on, defaults to {default_socket}")
+    p.set_defaults(func=None)
+    return parser
+
+
+def run(argv: list, clients: dict = None) -> int:
+    """ Parse and run one command in this process. Returns the exit status """
+    args = build_parser().parse_args(argv)
+    if args.command == "serve":
+        raise ValueError("serve can only be started from the command line")
+    return args.func(args, clients if clients is not None else {})
+
+
+class job_handler(socketserver.StreamRequestHandler):
+    """
+    One job per connection. The request is a JSON line {"argv": [...], "cwd": "..."}, the reply a JSON line
+    {"status": int, "output": str} with everything the command printed.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line: # a connection check, e.g. by serve looking for a running server
+            return
+        try:
+            request = json.loads(line)
+            argv, cwd = list(request["argv"]), request.get("cwd")
+        except (ValueError, KeyError, TypeError) as e:
+            self.reply(2, f"Bad request: {e}\n")
+            return
+
+        output = io.StringIO()
+        previous_cwd = os.getcwd()
+        try:
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                if cwd is not None:
+                    os.chdir(cwd) # relative paths are the client's
+                status = run(argv, self.server.clients)
+        except SystemExit as e: # argparse errors and the repository clients exit on HTTP errors
+            status = e.code if isinstance(e.code, int) else 1
+            if e.code is not None and not isinstance(e.code, int):
+                output.write(f"{e.code}\n")
+        except Exception as e:
+            status = 1
+            output.write(f"{type(e).__name__}: {e}\n")
+        finally:
+            os.chdir(previous_cwd)
+        self.reply(status or 0, output.getvalue())
+
+    def reply(self, status: int, output: str):
+        self.wfile.write((json.dumps({"status": status, "output": output}) + "\n").encode())
+
+
+def serve(socket_path: str):
+    """
+    Run jobs sent by `datatools --socket` one at a time, keeping imports and clients between them.
+
+    The socket is only accessible to the current user.
+    """
+    if not hasattr(socketserver, "UnixStreamServer"):
+        raise SystemExit("serve needs Unix domain sockets, which this platform does not have")
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            if s.connect_ex(socket_path) == 0:
+                raise SystemExit(f"A server is already listening on {socket_path}")
+        os.unlink(socket_path) # left behind by a server that did not shut down
+
+    for name in warm_modules:
+        try:
+            module = importlib.import_module(name)
+            getattr(module, "__file__", None) # runs modules bound with lazy_import
+        except ImportError as e:
+            print(f"Not preloading {name}: {e}")
+
+    previous_umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, job_handler)
+    finally:
+        os.umask(previous_umask)
+    server.clients = {}
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
+
+
+def submit(socket_path: str, argv: list) -> int:
+    """ Run a command in the serve process and print its output. Returns the exit status """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(socket_path)
+        except OSError as e:
+            print(f"Could not connect to {socket_path}: {e}. Start it with `datatools serve`", file=sys.stderr)
+            return 1
+        s.sendall((json.dumps({"argv": argv, "cwd": os.getcwd()}) + "\n").encode())
+        with s.makefile("rb") as f:
+            reply = json.loads(f.readline())
+    sys.stdout.write(reply["output"])
+    return reply["status"]
+
+
+def main(argv: list = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = build_parser().parse_args(argv)
+    if args.command == "serve":
+        return serve(args.socket or default_socket)
+    if args.socket:
+        # everything from the command name on, without the --socket option
+        return submit(args.socket, argv[argv.index(args.command):])
+    return args.func(args, {})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3 @@
+from datatools.utils.lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, submodules=["composite_template", "flow", "microscopy"])
@@ -1,3 +1,17 @@
+""" Functions for processing metadata from flow cytometry (FlowJo workspaces and FCS files) """
+
+from __future__ import annotations
+import mmap
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
+from datatools.utils.utils import group_join_unique
+from datatools.utils.metrics import timed, timed_file
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
 # get sample metadata
 keys = ['uri', 'fil', 'groupname', 'creator', "inst", 'cyt', 'cytsn', 'cytnum', 'tube name', 'src', 'experiment name'] # NOT ALL ARE USED EVERY TIME, 
 
@@ -15,88 +29,262 @@ reagent_cols = [
     "Reporter Name"
 ]
 
-# files_information = {}
-#     doc_id = row['id']
-#     name = row['name']
-
-#     data = {
-#         'token': config['redcapapi_prod'],
-#         'content': 'fileRepository',
-#         'action': 'export',
-#         'doc_id': doc_id,
-#         'returnFormat': 'json'
-#     }
-
-#     r = requests.post('https://redcap.seattlechildrens.org/api/',data=data)
-#     print('HTTP Status: ' + str(r.status_code))
-    
-#     temp_file_path = f"./flow_AD94/temp/{name}"
-#     utils.utils.check_file(temp_file_path)
-    
-#     with open(temp_file_path, 'wb') as file: 
-#         file.write(r.content)
-        
-#     temp = r.content.decode()
-#     temp = xml_helpers.parse_xml(temp)
-#     print('Number of samples: ', len(temp['Workspace']['SampleList']['Sample']))
-
-#     for s in temp['Workspace']['SampleList']['Sample']: 
-#         sample_information = {}
-#         keywords_df = pd.DataFrame(s['Keywords']['Keyword'])
-#         keywords_df = keywords_df.replace('', None).dropna(subset=['value'])
-#         keywords_df['value'] = keywords_df['value'].str.strip()
-#         keywords_df['name'] = keywords_df['name'].str.strip('$').str.lower()
-
-#         main_kw_df = keywords_df[keywords_df['name'].isin(keys)]
-#         main_kw_df = main_kw_df.set_index('name')
-#         sample_information['main'] = main_kw_df.T
-        
-#         reagents_df = keywords_df[keywords_df['name'].str.contains(r"p[0-9]{1,}N", regex=True, flags=re.IGNORECASE)].copy()
-
-#         anti_pattern = "^(?!SS|FS|Time).*" # remove basic channels
-#         reagents_df = reagents_df[reagents_df['value'].str.contains(anti_pattern)]
-#         reagents_df = reagents_df.sort_values(by = ['name'])
-
-#         # display(reagents_df)
-
-#         reagents_df = pd.DataFrame({'Reagent Name':reagents_df['value']}).reset_index(drop=True)
-#         for c in reagent_cols: 
-#             if c not in reagents_df.columns: 
-#                 reagents_df[c] = ''
-
-#         reagents_df = reagents_df[reagent_cols]
-#         reagents_df['File Name'] = main_kw_df.loc['fil'].value
-#         reagents_df['File Path'] = row['file_path']
-        
-#         if len(reagents_df) > 0: 
-#             sample_information['reagents'] = reagents_df
-        
-#         files_information[main_kw_df.loc['fil'].value] = sample_information
-        
-#     reagents_list = []
-#     flow_exp_list = []
-    
-#     for k,v in files_information.items():
-#         try: 
-#             reagents_list.append(v['reagents'])
-#         except Exception as e:
-#             # print(name)
-#             pass
-            
-#         try: 
-#             flow_exp_list.append(v['main'])
-#         except Exception as e: 
-#             print(e)
-#             pass
-    
-#     if len(reagents_list) == 0: 
-#         reagents_df_final = pd.DataFrame()
-#         reagent_mapper = pd.DataFrame()
-#     else:     
-#         reagents_df_final = pd.concat(reagents_list)
-#         # reagents_df_final = reagents_df_final.drop(columns=['File Name'])
-#         reagents_df_final = reagents_df_final.drop_duplicates().sort_values(by = 'Reagent Name')
-#         reagent_mapper = reagents_df_final.groupby('File Name').agg(unique_list)
-
-#     flow_experiment_df = pd.concat(flow_exp_list)
-#     flow_experiment_df = flow_experiment_df.rename(columns={'fil': 'File Name'})
+reagent_pattern = r"p[0-9]{1,}N" # $PnN channel names
+basic_channels = r"SS|FS|Time" # scatter and time channels, not reagents
+
+
+def read_workspace_keywords(source) -> pd.DataFrame:
+    """
+    Streams the samples of a FlowJo workspace (.wsp) and collects their keywords into one long table.
+
+    Workspace/SampleList/Sample elements are parsed with iterparse and cleared once read,
+    so memory does not grow with the number of samples.
+
+    Args:
+        source (str or file object): Path to the workspace, or a binary file object (e.g. io.BytesIO(response.content)).
+
+    Returns:
+        pd.DataFrame: 'sample' (position of the sample in the workspace), 'name' and 'value' for every keyword.
+    """
+    samples, names, values = [], [], []
+    stack = []
+    sample = -1
+    sample_list = None
+    with timed_file(source, "wsp"):
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                stack.append(elem.tag)
+                if stack[1:] == ["SampleList"]:
+                    sample_list = elem
+                elif stack[1:] == ["SampleList", "Sample"]:
+                    sample += 1
+                continue
+
+            if elem.tag == "Keyword" and stack[1:-1] == ["SampleList", "Sample", "Keywords"]:
+                samples.append(sample)
+                names.append(elem.attrib.get("name"))
+                values.append(elem.attrib.get("value"))
+            elif stack[1:] == ["SampleList", "Sample"]:
+                elem.clear()
+                sample_list.remove(elem)
+            stack.pop()
+
+    print("Number of samples: ", sample + 1)
+    return pd.DataFrame({"sample": samples, "name": names, "value": values})
+
+
+def clean_keywords(keywords_df: pd.DataFrame) -> pd.DataFrame:
+    """ Drop empty keywords, strip values and normalise names ('$FIL' -> 'fil') """
+    keywords_df = keywords_df.replace("", None).dropna(subset=["value"])
+    return keywords_df.assign(
+        value=keywords_df["value"].str.strip(),
+        name=keywords_df["name"].str.strip("$").str.lower(),
+    )
+
+
+def experiment_table(keywords_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per sample with the `keys` keywords as columns.
+
+    Args:
+        keywords_df (pd.DataFrame): Output of clean_keywords.
+
+    Returns:
+        pd.DataFrame: Experiment table with 'fil' renamed to 'File Name'. Samples sharing a file name keep the last one.
+    """
+    main_kw_df = keywords_df[keywords_df["name"].isin(keys)].drop_duplicates(subset=["sample", "name"])
+    flow_experiment_df = main_kw_df.pivot(index="sample", columns="name", values="value")
+    flow_experiment_df = flow_experiment_df[main_kw_df["name"].unique()]
+    flow_experiment_df.columns.name = None
+    flow_experiment_df = flow_experiment_df.rename(columns={"fil": "File Name"})
+    if "File Name" in flow_experiment_df.columns:
+        flow_experiment_df = flow_experiment_df.drop_duplicates(subset=["File Name"], keep="last")
+    return flow_experiment_df.reset_index(drop=True)
+
+
+def reagent_table(keywords_df: pd.DataFrame, file_path: str = None) -> pd.DataFrame:
+    """
+    Reagents from the $PnN channel names of every sample, leaving out scatter and time channels.
+
+    Args:
+        keywords_df (pd.DataFrame): Output of clean_keywords.
+        file_path (str or pd.Series): Path recorded in 'File Path', either one path for every sample
+            or a Series of paths indexed by sample.
+
+    Returns:
+        pd.DataFrame: `reagent_cols` plus 'File Name' and 'File Path', deduplicated and sorted by reagent name.
+    """
+    is_reagent = keywords_df["name"].str.contains(reagent_pattern, regex=True, flags=re.IGNORECASE)
+    reagents_df = keywords_df[is_reagent]
+    reagents_df = reagents_df[~reagents_df["value"].str.match(basic_channels)]
+    reagents_df = reagents_df.sort_values(by=["sample", "name"])
+
+    file_names = keywords_df[keywords_df["name"] == "fil"].drop_duplicates(subset=["sample"]).set_index("sample")["value"]
+
+    reagents_df = pd.DataFrame({"Reagent Name": reagents_df["value"].to_numpy(), "sample": reagents_df["sample"].to_numpy()})
+    for c in reagent_cols:
+        if c not in reagents_df.columns:
+            reagents_df[c] = ""
+    reagents_df["File Name"] = reagents_df["sample"].map(file_names)
+    reagents_df["File Path"] = reagents_df["sample"].map(file_path) if isinstance(file_path, pd.Series) else file_path
+
+    reagents_df = reagents_df[reagent_cols + ["File Name", "File Path"]]
+    return reagents_df.drop_duplicates().sort_values(by="Reagent Name").reset_index(drop=True)
+
+
+def reagent_mapper(reagents_df: pd.DataFrame) -> pd.DataFrame:
+    """ Reagents joined per file name """
+    return group_join_unique(reagents_df, "File Name", sep="_")
+
+
+def process_workspace(source, file_path: str = None):
+    """
+    Experiment and reagent tables for a FlowJo workspace.
+
+    Args:
+        source (str or file object): Path to the workspace, or a binary file object.
+        file_path (str): Path recorded in the reagent table. Defaults to `source` when it is a path.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): The experiment table and the reagent table.
+    """
+    if file_path is None and isinstance(source, str):
+        file_path = source
+    keywords_df = clean_keywords(read_workspace_keywords(source))
+    return experiment_table(keywords_df), reagent_table(keywords_df, file_path)
+
+
+def _split_text_segment(text: str) -> dict:
+    """ Keyword/value pairs of an FCS TEXT segment. The first character is the delimiter, doubled delimiters are escapes """
+    if len(text) == 0:
+        raise ValueError("Empty TEXT segment, no delimiter")
+    delimiter = text[0]
+    tokens = text[1:].split(delimiter)
+    if len(tokens) > 0 and tokens[-1] == "":
+        tokens.pop()
+
+    fields = []
+    i = 0
+    while i < len(tokens):
+        field = tokens[i]
+        i += 1
+        # keywords and values cannot be empty, so an empty token is an escaped delimiter
+        while i < len(tokens) and tokens[i] == "":
+            field += delimiter + (tokens[i + 1] if i + 1 < len(tokens) else "")
+            i += 2
+        fields.append(field)
+
+    return {k.upper(): v for k, v in zip(fields[0::2], fields[1::2])}
+
+
+@timed("fcs_text")
+def read_fcs_text(file_path) -> dict:
+    """
+    Reads the keywords in the HEADER and TEXT segments of an FCS file without reading the DATA segment.
+
+    Args:
+        file_path (str): Path to the .fcs file.
+
+    Returns:
+        dict: Keywords with upper-case names, e.g. {'$FIL': ..., '$CYT': ..., '$P1N': ...}.
+    """
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        version = mm[:6].decode("ascii", errors="replace")
+        if not version.startswith("FCS"):
+            raise ValueError(f"This is probably not an FCS file: {file_path}")
+
+        # HEADER: version, 4 spaces, then 8 byte ASCII offsets for the TEXT, DATA and ANALYSIS segments
+        text_start = int(mm[10:18])
+        text_end = int(mm[18:26])
+        if not 0 < text_start <= text_end < len(mm):
+            raise ValueError(f"TEXT segment {text_start}-{text_end} is outside the {len(mm)} byte file: {file_path}")
+        keywords = _split_text_segment(mm[text_start:text_end + 1].decode("utf-8", errors="replace"))
+
+        # FCS 3.x can put more keywords in a supplemental TEXT segment
+        s_start = int(keywords.get("$BEGINSTEXT", "0").strip() or 0)
+        s_end = int(keywords.get("$ENDSTEXT", "0").strip() or 0)
+        if s_start > 0 and s_end > s_start:
+            if s_end >= len(mm):
+                raise ValueError(f"Supplemental TEXT segment {s_start}-{s_end} is outside the {len(mm)} byte file: {file_path}")
+            keywords = _split_text_segment(mm[s_start:s_end + 1].decode("utf-8", errors="replace")) | keywords
+
+    keywords["FCS_VERSION"] = version
+    return keywords
+
+
+def _read_fcs_text_safe(file_path) -> tuple:
+    """ read_fcs_text for the thread pool. Errors are returned instead of raised so one bad file does not stop the run """
+    try:
+        return read_fcs_text(file_path), None
+    except (OSError, ValueError) as e: # missing, empty, truncated or not FCS
+        return None, f"{type(e).__name__}: {e}"
+
+
+def read_fcs_keywords(file_paths: list, workers: int = 8):
+    """
+    Reads the keywords of many FCS files on a thread pool into the long table returned by read_workspace_keywords.
+
+    Files without $FIL get the file name. Files that cannot be read are left out of the table and listed in the errors.
+
+    Args:
+        file_paths (list): Paths to the .fcs files.
+        workers (int): Number of threads.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame): 'sample' (position in `file_paths`), 'name' and 'value' for every keyword,
+            and the 'Files' and 'error' of every file that could not be read.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_read_fcs_text_safe, file_paths))
+
+    samples, names, values = [], [], []
+    errors = []
+    for i, (file_path, (keywords, error)) in enumerate(zip(file_paths, results)):
+        if error is not None:
+            errors.append({"Files": file_path, "error": error})
+            continue
+        keywords.setdefault("$FIL", os.path.basename(file_path))
+        samples.extend([i] * len(keywords))
+        names.extend(keywords.keys())
+        values.extend(keywords.values())
+
+    errors_df = pd.DataFrame(errors, columns=["Files", "error"])
+    if len(errors_df) > 0:
+        print(f"Could not read {len(errors_df)} of {len(file_paths)} files")
+    keywords_df = pd.DataFrame({
+        "sample": pd.Series(samples, dtype="int64"),
+        "name": pd.Series(names, dtype=object), # keeps the .str accessor working when no file could be read
+        "value": pd.Series(values, dtype=object),
+    })
+    return keywords_df, errors_df
+
+
+def process_fcs_files(file_paths: list, workers: int = 8):
+    """
+    Experiment and reagent tables read directly from FCS files, the same tables process_workspace builds.
+    Files that cannot be read are skipped and returned in the errors table.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame, pd.DataFrame): The experiment table, the reagent table and per-file errors.
+    """
+    file_paths = [str(f) for f in file_paths]
+    keywords_df, errors_df = read_fcs_keywords(file_paths, workers)
+    keywords_df = clean_keywords(keywords_df)
+    print("Number of samples: ", len(file_paths) - len(errors_df))
+    return experiment_table(keywords_df), reagent_table(keywords_df, pd.Series(file_paths)), errors_df
+
+
+def scan_fcs_directory(root, workers: int = 8):
+    """
+    Experiment and reagent tables for every .fcs file under a directory.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame, pd.DataFrame): The experiment table, the reagent table and per-file errors.
+    """
+    file_paths = sorted(
+        os.path.join(dir_path, name)
+        for dir_path, _, file_names in os.walk(root)
+        for name in file_names
+        if name.lower().endswith(".fcs")
+    )
+    return process_fcs_files(file_paths, workers)
@@ -1,40 +1,129 @@
 """ Functions for procesing metadata from microscopy files"""
 
 
-from readlif.reader import LifFile
+from __future__ import annotations
+import io
 import os
+import mmap
+import struct
+import time
 from glob import glob
-import numpy as np
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from imaris_ims_file_reader.ims import ims
+from functools import cached_property
 from datatools.utils import xml_helpers
-from datatools.utils.utils import transform_dict
+from datatools.utils.cache import file_cache
+from datatools.utils import metrics
+from datatools.utils.metrics import timed, timed_file
+from datatools.utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+h5py = lazy_import("h5py")
+readlif_reader = lazy_import("readlif.reader")
+tqdm = lazy_import("tqdm")
 
 md_keys = {
     "general": ["path", "name", "channels"],
     "settings": ["MicroscopeModel", "Magnification", "ObjectiveName"],
 }
 
+# readers chosen by file extension, with magic bytes as the fallback
+reader_extensions = {".lif": "lif", ".ims": "ims"}
+LIF_MAGIC = b"\x70\x00\x00\x00"
+HDF5_MAGIC = b"\x89HDF\r\n\x1a\n" # .ims files are HDF5 containers
+
+# DataSetInfo/Image attributes kept by ims_metadata_extract
+ims_keys = [
+    "ElementName",
+    "LensPower",
+    "MicroscopeModality",
+    "NumericalAperture",
+    "OriginalFormat",
+    "OriginalFormatFileIOVersion",
+    'Unit',
+]
+
+class lif_header:
+    """
+    Metadata-only view of a .lif file.
+
+    Memory-maps the file and decodes just the XML header block, so the image memory blocks are never walked.
+    Exposes the `filename`, `xml_header`, `xml_root` and `image_list` attributes that the processors read from LifFile.
+    """
+    def _recursive_image_find(self, *args, **kwargs):
+        # same image list as readlif builds from the header
+        return readlif_reader.LifFile._recursive_image_find(self, *args, **kwargs)
+
+    def __init__(self, file_path):
+        self.filename = file_path
+        self.xml_header = read_lif_header(file_path)
+        self.xml_root = ET.fromstring(self.xml_header)
+        self.image_list = self._recursive_image_find(self.xml_root)
+
+
+def read_lif_header(file_path) -> str:
+    """
+    Reads the XML header of a .lif file without reading the image data.
+
+    Args:
+        file_path (str): Path to the .lif file.
+
+    Returns:
+        str: The decoded XML header.
+    """
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # layout: magic (4 bytes), block length (4), memory byte (1), header length in characters (4), UTF-16 header
+        if mm[:4] != LIF_MAGIC:
+            raise ValueError(f"This is probably not a LIF file: {file_path}")
+        if mm[8:9] != b"\x2a":
+            raise ValueError(f"Expected LIF memory byte at 8: {file_path}")
+        (header_len,) = struct.unpack("<I", mm[9:13])
+        return mm[13:13 + header_len * 2].decode("utf-16")
+
+
 class lif_file_processor: 
-    def __init__(self, file_path): 
+    def __init__(self, file_path, metadata_only: bool = False, cache: file_cache = None): 
+        """
+        Args:
+            file_path (str): Path to the .lif file.
+            metadata_only (bool): Only read the XML header instead of indexing the whole file with LifFile.
+                Images cannot be read from the file in this mode.
+            cache (file_cache): Reuse `md_df` from an earlier run while the file is unchanged. The file is not
+                opened on a cache hit.
+        """
         self.file_path = file_path
-        self.lif = LifFile(file_path)
-        self.md_df = self.get_overall_md()
+        self.metadata_only = metadata_only
+        if cache is not None: 
+            self.md_df = cache.cached(file_path, 'lif_metadata', self.get_overall_md)
+        else: 
+            self.md_df = self.get_overall_md()
         self.md_keys = {
             "general": ["path", "name", "channels"],
             "settings": ["MicroscopeModel", "Magnification", "ObjectiveName"],
         }
+
+    @cached_property
+    def lif(self): 
+        """ The header (metadata_only) or LifFile, opened on first use """
+        with timed_file(self.file_path, 'lif'): 
+            return lif_header(self.file_path) if self.metadata_only else readlif_reader.LifFile(self.file_path)
         
+    @cached_property
+    def xml_index(self): 
+        """ Index of the parsed XML header, built on first use """
+        return xml_helpers.XmlIndex(self.lif.xml_root)
 
     def get_overall_md(self): 
         md_temp = []
 
-        for image in self.lif.image_list: 
+        image_list = self.lif.image_list # open the file here, so a read error is raised and not printed by get_software_md
+        # the hardware settings are file level, look them up once
+        temp_hardware = {"hardware." + k: v for k,v in (self.get_software_md() or {}).items()}
+        for image in image_list: 
             temp = {'general.'+k:image[k] for k in md_keys['general']}
             temp_settings = {"setting."+k:image['settings'][k] for k in md_keys['settings']}
-            temp_hardware = {"hardware." + k: v for k,v in self.get_software_md().items()}
             temp_final = temp | temp_settings | temp_hardware
             md_temp.append(temp_final)
         
@@ -48,12 +137,86 @@ class lif_file_processor:
     
     def get_software_md(self):
         try: 
-            result = xml_helpers.recursive_search_for_tag_with_attribute(self.lif.xml_header, 'Attachment', 'Name', 'HardwareSetting')
+            result = self.xml_index.find_with_attribute('Attachment', 'Name', 'HardwareSetting')
             software_md = result.attrib
             return software_md
         except Exception as e: 
             print(e)
             return None
+
+    @timed("lif_pixel_stats")
+    def get_pixel_stats(self, workers: int = 4, bins: int = 256) -> pd.DataFrame:
+        """
+        Adds per-series intensity statistics to `md_df` as `stats.*` columns.
+
+        Planes are read one at a time with `get_frame` and reduced with NumPy on a thread pool,
+        so memory stays at about one plane per worker.
+
+        Args:
+            workers (int): Number of threads.
+            bins (int): Number of histogram bins over the full range of the channel bit depth. Must be a power of two.
+
+        Returns:
+            pd.DataFrame: The statistics, one row per series: 'stats.min', 'stats.max', 'stats.mean',
+                'stats.saturation_fraction' and 'stats.histogram' (list of counts).
+        """
+        if self.metadata_only: 
+            raise ValueError("Pixel statistics need the image data, use metadata_only=False")
+        if bins <= 0 or bins & (bins - 1): 
+            raise ValueError("bins must be a power of two")
+
+        images = [self.lif.get_image(i) for i in range(len(self.lif.image_list))]
+        planes = [
+            (i, z, t, c, m)
+            for i, image in enumerate(images)
+            for m in range(image.n_mosaic)
+            for t in range(image.nt)
+            for z in range(image.nz)
+            for c in range(image.channels)
+        ]
+
+        totals = [
+            {'min': None, 'max': None, 'sum': 0, 'count': 0, 'saturated': 0, 'histogram': np.zeros(bins, dtype=np.int64)} 
+            for _ in images
+        ]
+        with ThreadPoolExecutor(max_workers=workers) as executor: 
+            results = executor.map(lambda p: _plane_stats(images[p[0]], *p[1:], bins=bins), planes)
+            for (i, *_), plane in zip(planes, results): 
+                total = totals[i]
+                total['min'] = plane['min'] if total['min'] is None else min(total['min'], plane['min'])
+                total['max'] = plane['max'] if total['max'] is None else max(total['max'], plane['max'])
+                for k in ['sum', 'count', 'saturated', 'histogram']: 
+                    total[k] = total[k] + plane[k]
+
+        stats_df = pd.DataFrame({
+            'stats.min': [t['min'] for t in totals],
+            'stats.max': [t['max'] for t in totals],
+            'stats.mean': [t['sum'] / t['count'] if t['count'] > 0 else np.nan for t in totals],
+            'stats.saturation_fraction': [t['saturated'] / t['count'] if t['count'] > 0 else np.nan for t in totals],
+            'stats.histogram': [t['histogram'].tolist() for t in totals],
+        })
+        
+        self.md_df = pd.concat(
+            [self.md_df.drop(columns=stats_df.columns, errors='ignore').reset_index(drop=True), stats_df], axis=1
+        )
+        return stats_df
+
+
+def _plane_stats(image, z: int, t: int, c: int, m: int, bins: int) -> dict:
+    """ Reductions for one plane of a LifImage. Saturation and histogram range use the channel's bit depth """
+    plane = np.asarray(image.get_frame(z=z, t=t, c=c, m=m))
+    bit_depth = image.bit_depth[c] if c < len(image.bit_depth) else image.bit_depth[0]
+    max_value = 2**bit_depth - 1
+    shift = max(bit_depth - (bins.bit_length() - 1), 0)
+    histogram = np.bincount(np.minimum(plane.ravel() >> shift, bins - 1), minlength=bins)
+    return {
+        'min': int(plane.min()),
+        'max': int(plane.max()),
+        'sum': int(plane.sum(dtype=np.int64)),
+        'count': plane.size,
+        'saturated': int(np.count_nonzero(plane >= max_value)),
+        'histogram': histogram,
+    }
         
     
 # def process_file(file_name):
@@ -75,11 +238,151 @@ class lif_file_processor:
 #     return md_df, channels
     
 
-def get_channels(lfil):
+channel_tags = ("ChannelProperty", "ChannelDescription") # in order of preference
+
+
+def stream_channel_records(xml_header: str, tags: tuple = channel_tags):
+    """
+    Collects the channel elements of every sub-image in a single pass over the XML header.
+
+    Uses iterparse and drops the children of each element once it is closed, so memory stays bounded
+    on headers with many series. Each hit is reduced to its Key/Value text (see transform_dict) and
+    returned column-wise instead of as one dict per element.
+
+    Args:
+        xml_header (str): The XML header of the .lif file.
+        tags (tuple): Tags to collect.
+
+    Returns:
+        (str, list, dict): Name of the top-level element, names of the sub-image elements and, per tag,
+            a dict of equal length lists 'element' (index into the names), 'path', 'key' and 'value'.
+    """
+    top_name = None
+    element_names = []
+    records = {tag: {"element": [], "path": [], "key": [], "value": []} for tag in tags}
+
+    stack = [] # tags from the document root to the current element
+    sub_image = None # index of the sub-image the parser is in
+    for event, elem in ET.iterparse(io.StringIO(xml_header), events=("start", "end")):
+        if event == "start":
+            stack.append(elem.tag)
+            depth = len(stack)
+            if depth == 2 and elem.tag == "Element" and top_name is None:
+                top_name = elem.attrib.get("Name")
+            elif depth == 4 and stack[1:] == ["Element", "Children", "Element"]:
+                sub_image = len(element_names)
+                element_names.append(elem.attrib.get("Name"))
+            continue
+
+        if sub_image is not None and elem.tag in records:
+            key = elem.find("Key")
+            value = elem.find("Value")
+            columns = records[elem.tag]
+            columns["element"].append(sub_image)
+            # path from the sub-image element, as recursive_find_with_path builds it
+            columns["path"].append("/" + "/".join(stack[3:]))
+            columns["key"].append(key.text.strip() if key is not None and key.text else None)
+            columns["value"].append(value.text.strip() if value is not None and value.text else None)
+
+        # keep the element's own text for its parent, but free its subtree
+        del elem[:]
+        if len(stack) == 4 and elem.tag == "Element":
+            sub_image = None
+        stack.pop()
+
+    return top_name, element_names, records
+
+
+@timed("lif_channel_table")
+def get_channel_table(lfil, tags: tuple = channel_tags) -> pd.DataFrame:
+    """
+    Builds one channel table for all sub-images of a file.
+
+    Same rows as get_channels, but the table is built column-wise for the whole file and the fill and
+    collapse run as grouped operations over it instead of once per sub-image. The repeated strings
+    are stored as categoricals.
+
+    Args:
+        lfil: An object containing an XML header attribute.
+        tags (tuple): Channel tags to look for, in order of preference per sub-image.
+
+    Returns:
+        pd.DataFrame: 'file_name', 'element_name', 'element_id' (position of the sub-image in the file),
+            a column per channel property key (e.g. 'DyeName') and 'path'.
+    """
+    top_name, element_names, records = stream_channel_records(lfil.xml_header, tags)
+
+    # each sub-image uses the first tag it has hits for
+    chosen = {}
+    for tag in tags: 
+        for e in records[tag]['element']: 
+            chosen.setdefault(e, tag)
+
+    elements, paths, keys, values = [], [], [], []
+    for tag in tags: 
+        columns = records[tag]
+        for i, e in enumerate(columns['element']): 
+            if chosen[e] == tag: 
+                elements.append(e)
+                paths.append(columns['path'][i])
+                keys.append(columns['key'][i])
+                values.append(columns['value'][i])
+
+    n = len(elements)
+    table = {'element_id': elements, 'path': paths}
+    for i, (key, value) in enumerate(zip(keys, values)): 
+        if key is not None and value is not None: 
+            table.setdefault(key, [None] * n)[i] = value
+    
+    df = pd.DataFrame(table)
+    value_cols = [c for c in df.columns if c not in ['element_id', 'path']]
+    df = df.sort_values('element_id', kind='stable').reset_index(drop=True)
+    df['path'] = df['path'].astype('category')
+
+    # per sub-image: forward fill within each path, then back fill across the sub-image
+    if len(value_cols) > 0: 
+        filled = df.groupby(['element_id', 'path'], sort=False, observed=True)[value_cols].ffill()
+        df[value_cols] = filled.groupby(df['element_id'], sort=False).bfill()
+
+    subset = [c for c in ['element_id', 'path', 'DyeName'] if c in df.columns]
+    df = df.drop_duplicates(subset=subset).reset_index(drop=True)
+
+    df.insert(0, 'file_name', pd.Categorical([top_name] * len(df)))
+    df.insert(1, 'element_name', pd.Categorical(pd.Series(element_names, dtype=object).take(df['element_id']).to_numpy()))
+    if 'DyeName' in df.columns: 
+        df['DyeName'] = df['DyeName'].astype('category')
+    # same column order as get_channels, with the element key after the element name
+    df = df[['file_name', 'element_name', 'element_id'] + value_cols + ['path']]
+    
+    return df
+
+
+def split_channel_table(df: pd.DataFrame) -> list:
+    """ Split a get_channel_table result into the per sub-image frames returned by get_channels """
+    if len(df) == 0: 
+        return []
+    element_ids = df['element_id'].to_numpy()
+    df = df.drop(columns='element_id')
+    category_cols = df.select_dtypes(include='category').columns
+    df = df.astype({c: object for c in category_cols})
+
+    # columns with values in each sub-image, and where each sub-image starts (rows are sorted by element)
+    has_values = df.notna().groupby(element_ids, sort=True).any()
+    starts = np.flatnonzero(np.r_[True, element_ids[1:] != element_ids[:-1]])
+    ends = np.r_[starts[1:], len(df)]
+
+    full_results = []
+    for (_, keep), start, end in zip(has_values.iterrows(), starts, ends): 
+        full_results.append(df.iloc[start:end, keep.to_numpy()].reset_index(drop=True))
+    return full_results
+
+
+def get_channels(lfil, cache: file_cache = None):
     """
     Extracts channel information from the XML header of a given file.
     Args:
         lfil: An object containing an XML header attribute.
+        cache (file_cache): Reuse the channels from an earlier run while `lfil.filename` is unchanged.
     Returns:
         A list of pandas DataFrames, each containing channel information for sub-images.
         Each DataFrame includes the following columns:
@@ -88,37 +391,13 @@ def get_channels(lfil):
             - 'path': The path to the channel property.
             - 'DyeName': The name of the dye used in the channel.
             - Additional columns transformed from the channel property elements.
-    """
-    
-    root = ET.fromstring(lfil.xml_header)
-    top_name = root.find('Element').attrib['Name']
-    sub_image_elements = root.findall('Element/Children/Element')
-    full_results = []
-    for e in sub_image_elements: 
-        results = []
-        possible_tags = ['ChannelProperty', 'ChannelDescription']
-        for tag in possible_tags: 
-            elements = xml_helpers.recursive_find_with_path(e, tag)
-            if len(elements) > 0: 
-                break
-            
-        for t in elements: 
-            temp = {'path': t[0]} | transform_dict(xml_helpers.parse_element(t[1]))
-            results.append(temp)
 
-        results_df = pd.DataFrame(results)
-
-        df_filled = results_df.groupby('path').ffill().bfill()
-        df_filled['path'] = results_df['path']
-
-        df_collapsed = df_filled.drop_duplicates(subset=['path', 'DyeName']).reset_index(drop = True)
-        df_collapsed
-        sub_image_elements[0].attrib['Name']
-        df_collapsed.insert(0, 'file_name', top_name)
-        df_collapsed.insert(1, 'element_name', e.attrib['Name'])
-        full_results.append(df_collapsed)
+    Use get_channel_table for a single table covering every sub-image.
+    """
+    if cache is not None: 
+        return split_channel_table(cache.cached(lfil.filename, 'lif_channel_table', lambda: get_channel_table(lfil)))
     
-    return full_results
+    return split_channel_table(get_channel_table(lfil))
 
 
 class ims_file_processor:
@@ -144,23 +423,10 @@ class ims_file_processor:
         
         # self.process_file()
         
-    def ims_metadata_extract(file_path): 
-        keys = [
-            "ElementName",
-            "LensPower",
-            "MicroscopeModality",
-            "NumericalAperture",
-            "OriginalFormat",
-            "OriginalFormatFileIOVersion",
-            'Unit',
-        ]
-        
-        a = ims(file_path)
-
-        metadata = {k: a.read_attribute("DataSetInfo/Image", k) for k in keys}
-        metadata['dimensions'] = 'x'.join([a.read_attribute("DataSetInfo/Image", 'X'), a.read_attribute("DataSetInfo/Image", 'Y'), a.read_attribute("DataSetInfo/Image", 'Z')]) 
-        metadata['file_name'] = Path(file_path).name
-        return metadata
+    @staticmethod
+    def ims_metadata_extract(file_path, cache: file_cache = None): 
+        """ See the module level ims_metadata_extract """
+        return ims_metadata_extract(file_path, cache)
 
     def get_overall_md(self): 
         md_temp = []
@@ -187,28 +453,7 @@ class ims_file_processor:
         
         :return: A list of DataFrames containing the channel information.
         """
-        root = ET.fromstring(self.lfil.xml_header)
-        top_name = root.find('Element').attrib['Name']
-        sub_image_elements = root.findall('Element/Children/Element')
-        full_results = []
-
-        for e in sub_image_elements:
-            results = []
-            for t in xml_helpers.recursive_find_with_path(e, 'ChannelProperty'):
-                temp = {'path': t[0]} | transform_dict(xml_helpers.parse_element(t[1]))
-                results.append(temp)
-
-            results_df = pd.DataFrame(results)
-
-            df_filled = results_df.groupby('path').ffill().bfill()
-            df_filled['path'] = results_df['path']
-
-            df_collapsed = df_filled.drop_duplicates(subset=['path', 'DyeName']).reset_index(drop=True)
-            df_collapsed.insert(0, 'file_name', top_name)
-            df_collapsed.insert(1, 'element_name', e.attrib['Name'])
-            full_results.append(df_collapsed)
-
-        return full_results
+        return split_channel_table(get_channel_table(self.lfil, tags=('ChannelProperty',)))
 
     def cleanup(self):
         """
@@ -216,8 +461,7 @@ class ims_file_processor:
         
         :return: A DataFrame containing the cleaned-up results.
         """
-        channels = self.get_channels()
-        final_results = pd.concat(channels)
+        final_results = get_channel_table(self.lfil, tags=('ChannelProperty',))
         final_results = final_results.drop_duplicates(subset=['DyeName']).reset_index(drop=True)
         final_results.info()
         main_cols = [
@@ -282,21 +526,244 @@ def write_out_results(sub_dir, exp_name, output_file_name, exp: pd.DataFrame, ex
         if exp_reagents is not None:
             exp_reagents.to_excel(writer, sheet_name='reagents', index=False)
             
-def ims_metadata_extract(file_path): 
-    keys = [
-        "ElementName",
-        "LensPower",
-        "MicroscopeModality",
-        "NumericalAperture",
-        "OriginalFormat",
-        "OriginalFormatFileIOVersion",
-        'Unit',
-    ]
-    
-    a = ims(file_path)
+def ims_metadata_extract(file_path, cache: file_cache = None): 
+    if cache is not None: 
+        md = cache.cached(file_path, 'ims_metadata', lambda: pd.DataFrame([ims_metadata_extract(file_path)]))
+        return md.to_dict('records')[0]
+
+    with timed_file(file_path, 'ims'): 
+        attributes = read_ims_attributes(file_path, groups=['Image'])
 
-    metadata = {k: a.read_attribute("DataSetInfo/Image", k) for k in keys}
-    metadata['dimensions'] = 'x'.join([a.read_attribute("DataSetInfo/Image", 'X'), a.read_attribute("DataSetInfo/Image", 'Y'), a.read_attribute("DataSetInfo/Image", 'Z')]) 
+    metadata = {k: attributes[f"Image.{k}"] for k in ims_keys}
+    metadata['dimensions'] = 'x'.join([attributes['Image.X'], attributes['Image.Y'], attributes['Image.Z']]) 
     metadata['file_name'] = Path(file_path).name
     metadata['Files'] = file_path
-    return metadata
\ No newline at end of file
+    return metadata
+
+
+def _decode_ims_attribute(value):
+    """ Imaris stores text attributes as arrays of single characters """
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'S': 
+            return b''.join(value.ravel().tolist()).decode('ascii', errors='replace')
+        return value.item() if value.size == 1 else value.tolist()
+    if isinstance(value, bytes): 
+        return value.decode('ascii', errors='replace')
+    return value
+
+
+def read_ims_attributes(file_path, groups: list = None) -> dict:
+    """
+    Reads the DataSetInfo attribute groups of an .ims file in one pass.
+
+    Opens the HDF5 container read-only and never touches the DataSet (pixel) groups,
+    so it is much cheaper than opening the file with imaris_ims_file_reader.
+
+    Args:
+        file_path (str): Path to the .ims file.
+        groups (list): DataSetInfo groups to read, e.g. ['Image', 'Channel 0']. Defaults to all of them.
+
+    Returns:
+        dict: Attributes keyed as '<group>.<attribute>', e.g. 'Image.LensPower'.
+    """
+    attributes = {}
+    with h5py.File(file_path, 'r') as f: 
+        info = f['DataSetInfo']
+        for group_name in (groups if groups is not None else info.keys()): 
+            for k, v in info[group_name].attrs.items(): 
+                attributes[f"{group_name}.{k}"] = _decode_ims_attribute(v)
+    return attributes
+
+
+def ims_metadata_table(file_paths: list, groups: list = None, progress: bool = True) -> pd.DataFrame:
+    """
+    Reads the DataSetInfo attributes of many .ims files into one DataFrame.
+
+    Args:
+        file_paths (list): Paths to the .ims files.
+        groups (list): DataSetInfo groups to read. Defaults to all of them.
+        progress (bool): Show a progress bar.
+
+    Returns:
+        pd.DataFrame: One row per file with '<group>.<attribute>' columns, 'file_name', 'Files' and
+            'error' for files that could not be read.
+    """
+    rows = []
+    for file_path in tqdm.tqdm(file_paths, desc="Reading .ims attributes...", disable=not progress): 
+        row = {'file_name': Path(file_path).name, 'Files': file_path, 'error': None}
+        try: 
+            row = read_ims_attributes(file_path, groups) | row
+        except Exception as e: 
+            row['error'] = f"{type(e).__name__}: {e}"
+        rows.append(row)
+    
+    return pd.DataFrame(rows)
+
+def detect_reader(file_path, sniff: bool = True):
+    """
+    Picks the metadata reader for a file from its extension, falling back to the magic bytes.
+
+    Args:
+        file_path (str): Path to the file.
+        sniff (bool): Read the first bytes of files with an unknown extension.
+
+    Returns:
+        str: 'lif', 'ims' or None if the file is not a supported microscopy file.
+    """
+    reader = reader_extensions.get(Path(file_path).suffix.lower())
+    if reader is not None or not sniff:
+        return reader
+
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(len(HDF5_MAGIC))
+    except OSError:
+        return None
+
+    if head[:len(LIF_MAGIC)] == LIF_MAGIC:
+        return "lif"
+    if head == HDF5_MAGIC:
+        return "ims"
+    return None
+
+
+def find_microscopy_files(root, sniff: bool = True) -> list:
+    """
+    Walks a directory and returns the supported microscopy files with their reader.
+
+    Args:
+        root (str): Top level directory to search.
+        sniff (bool): Check the magic bytes of files with an unknown extension.
+
+    Returns:
+        list: Sorted list of (file_path, reader) tuples.
+    """
+    found = []
+    for dir_path, _, file_names in os.walk(root):
+        for name in file_names:
+            file_path = os.path.join(dir_path, name)
+            reader = detect_reader(file_path, sniff=sniff)
+            if reader is not None:
+                found.append((file_path, reader))
+    return sorted(found)
+
+
+def _harvest_file(file_path, reader, metadata_only=True, collect_metrics=False):
+    """
+    Worker for harvest_directory. Errors are returned instead of raised so one bad file does not stop the run.
+    With `collect_metrics`, the metrics recorded for the file are returned too, for the parent to merge.
+    """
+    start = time.perf_counter()
+    result = {"Files": file_path, "reader": reader, "metadata": None, "channels": None, "error": None, "metrics": None}
+    with metrics.isolated(collect_metrics) as file_metrics:
+        try:
+            if reader == "lif":
+                processor = lif_file_processor(file_path, metadata_only=metadata_only)
+                result["metadata"] = processor.md_df
+                result["channels"] = get_channel_table(processor.lif)
+            elif reader == "ims":
+                result["metadata"] = pd.DataFrame([ims_metadata_extract(file_path)])
+            else:
+                raise ValueError(f"No reader for file: {file_path}")
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+    if collect_metrics:
+        result["metrics"] = file_metrics.snapshot()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _cached_harvest(cache: file_cache, file_path, reader):
+    """ harvest_directory result for a file from the cache, or None if any part of it is missing """
+    if reader == "lif":
+        md = cache.get(file_path, "lif_metadata")
+        channels = cache.get(file_path, "lif_channel_table") if md is not None else None
+        if channels is None:
+            return None
+    elif reader == "ims":
+        md = cache.get(file_path, "ims_metadata")
+        channels = None
+        if md is None:
+            return None
+    else:
+        return None
+    return {"Files": file_path, "reader": reader, "metadata": md, "channels": channels, "error": None, "seconds": 0.0}
+
+
+def _store_harvest(cache: file_cache, result: dict):
+    if result["error"] is not None:
+        return
+    if result["reader"] == "lif":
+        cache.put(result["Files"], "lif_metadata", result["metadata"])
+        cache.put(result["Files"], "lif_channel_table", result["channels"])
+    else:
+        cache.put(result["Files"], "ims_metadata", result["metadata"])
+
+
+@timed("harvest_directory")
+def harvest_directory(root, workers: int = None, sniff: bool = True, progress: bool = True, metadata_only: bool = True, cache_dir = None):
+    """
+    Extracts metadata and channels from every .lif and .ims file under a directory using a process pool.
+    Metrics the workers record (see datatools.utils.metrics) are merged into this process.
+
+    Args:
+        root (str): Top level directory to search.
+        workers (int): Number of worker processes. Defaults to the number of CPUs, 1 runs in this process.
+        sniff (bool): Check the magic bytes of files with an unknown extension.
+        progress (bool): Show a progress bar.
+        metadata_only (bool): Only read the XML header of .lif files (see lif_header).
+        cache_dir (str): If set, reuse results for unchanged files from a file_cache in this directory.
+
+    Returns:
+        (pd.DataFrame, pd.DataFrame, pd.DataFrame): Combined metadata, combined channels and per-file errors.
+    """
+    files = find_microscopy_files(root, sniff=sniff)
+    print(f"Number of microscopy files in {root}: {len(files)}")
+
+    # cache lookups and writes stay in this process so the workers never contend for the index
+    cache = file_cache(cache_dir) if cache_dir is not None else None
+    results = [None] * len(files)
+    pending = []
+    for i, (file_path, reader) in enumerate(files):
+        if cache is not None:
+            results[i] = _cached_harvest(cache, file_path, reader)
+        if results[i] is None:
+            pending.append(i)
+    if cache is not None:
+        print(f"Reusing cached results for {len(files) - len(pending)} files")
+
+    def finish(i, result):
+        metrics.merge(result.pop("metrics", None))
+        results[i] = result
+        if cache is not None:
+            _store_harvest(cache, result)
+        pbar.update(1)
+
+    with tqdm.tqdm(total=len(files), initial=len(files) - len(pending), desc="Harvesting metadata...", disable=not progress) as pbar:
+        if workers == 1:
+            for i in pending:
+                finish(i, _harvest_file(*files[i], metadata_only, metrics.enabled))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_harvest_file, *files[i], metadata_only, metrics.enabled): i for i in pending}
+                for future in as_completed(futures):
+                    finish(futures[future], future.result())
+
+    md_list = [r["metadata"] for r in results if r["metadata"] is not None]
+    channel_list = [
+        r["channels"].assign(Files=r["Files"]) 
+        for r in results if r["channels"] is not None and len(r["channels"]) > 0
+    ]
+    errors = [{k: r[k] for k in ["Files", "reader", "error"]} for r in results if r["error"] is not None]
+
+    md_df = pd.concat(md_list, ignore_index=True) if len(md_list) > 0 else pd.DataFrame()
+    channels_df = pd.concat(channel_list, ignore_index=True) if len(channel_list) > 0 else pd.DataFrame()
+    # categories differ between files, so restore the categorical columns after combining
+    category_cols = [c for c in ['file_name', 'element_name', 'path', 'DyeName', 'Files'] if c in channels_df.columns]
+    channels_df = channels_df.astype({c: 'category' for c in category_cols})
+    errors_df = pd.DataFrame(errors, columns=["Files", "reader", "error"])
+
+    if len(errors_df) > 0:
+        print(f"Could not process {len(errors_df)} of {len(files)} files")
+
+    return md_df, channels_df, errors_df
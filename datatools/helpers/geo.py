@@ -1,10 +1,14 @@
+from __future__ import annotations
 import time
-import pandas as pd
-from tqdm import tqdm
 import re
-import requests
-from bs4 import BeautifulSoup
-from datatools.pubmed import esummary
+from datatools.repositories.pubmed import esummary
+from datatools.utils.metrics import timed_http
+from datatools.utils.lazy import lazy_import
+
+bs4 = lazy_import("bs4")
+pd = lazy_import("pandas")
+requests = lazy_import("requests")
+tqdm = lazy_import("tqdm")
 
 biosample_fields = [
     "biosample_id",
@@ -23,7 +27,7 @@ biosample_fields = [
 
 
 def find_value_in_table(html, target_value: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+    soup = bs4.BeautifulSoup(html, "html.parser")
     table = soup.find("table")
     if not table:
         return None
@@ -38,7 +42,7 @@ def find_value_in_table(html, target_value: str) -> str:
 
 
 def get_table_values(html_text: str):
-    soup = BeautifulSoup(html_text, "html.parser")
+    soup = bs4.BeautifulSoup(html_text, "html.parser")
     table = soup.find_all("tr")
     full_table = {}
     for i, _ in enumerate(table):
@@ -52,16 +56,18 @@ def get_table_values(html_text: str):
 
 
 def get_sample_page(gsm_id: str):
-    response = requests.get(
-        url=f"https://www.ncbi.nlm.nih.gov/geo/query/acc.cgi?acc={gsm_id}",  # using GSM - samples
-    )
+    with timed_http("geo/acc.cgi", "GET") as call:
+        response = requests.get(
+            url=f"https://www.ncbi.nlm.nih.gov/geo/query/acc.cgi?acc={gsm_id}",  # using GSM - samples
+        )
+        call.record_response(response)
     html_text = response.text
     target_value = "Title"
     found_value = find_value_in_table(html_text, target_value)
 
     full_table = get_table_values(found_value)
     full_table = {
-        BeautifulSoup(k, "html.parser").get_text(): v for k, v in full_table.items()
+        bs4.BeautifulSoup(k, "html.parser").get_text(): v for k, v in full_table.items()
     }
 
     main_keys_samples = [
@@ -95,13 +101,13 @@ def get_sample_page(gsm_id: str):
     }
     characteristics = reduced.pop("Characteristics", None)
     reduced = {
-        k: BeautifulSoup(v, "html.parser").get_text() for k, v in reduced.items()
+        k: bs4.BeautifulSoup(v, "html.parser").get_text() for k, v in reduced.items()
     }  # remove html tags
 
     if characteristics is not None:
         try:  # get characteristics
             test = [
-                BeautifulSoup(k, "html.parser").get_text().split(":")
+                bs4.BeautifulSoup(k, "html.parser").get_text().split(":")
                 for k in characteristics.split("<br/>")
             ]
             test = [[t2.strip() for t2 in t] for t in test if len(t) > 1]
@@ -134,7 +140,7 @@ def get_samples(gds_id: str) -> pd.DataFrame:
 
 def get_sample_pages(samples_df: str):
     sample_pages = []
-    for acc_id in tqdm(
+    for acc_id in tqdm.tqdm(
         samples_df["Accession"], desc="Getting sample pages...", leave=False
     ):
         try:
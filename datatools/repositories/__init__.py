@@ -0,0 +1,3 @@
+from datatools.utils.lazy import attach
+
+__getattr__, __dir__, __all__ = attach(__name__, submodules=["bioimage", "immport", "pubmed", "redcap"])
@@ -1,5 +1,8 @@
+from __future__ import annotations
 from datatools.utils import apply_to_list
-import pandas as pd
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
 
 def dict_to_pagetab_string(d: dict, section_header=None) -> None:
     """
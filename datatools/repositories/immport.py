@@ -1,14 +1,31 @@
-from dotenv import dotenv_values
-import requests
+from __future__ import annotations
 import zipfile
-import pandas as pd
 import json
 from pathlib import Path
 import re
 from datatools.repositories import redcap
+from datatools.utils.metrics import timed_http
 from glob import glob
+from functools import lru_cache
+from datatools.utils.lazy import lazy_import
+
+requests = lazy_import("requests")
+pd = lazy_import("pandas")
+
+
+@lru_cache(maxsize=None)
+def load_config(path: str = ".env.secrets") -> dict:
+    """ ImmPort credentials from a dotenv file, read on first use """
+    from dotenv import dotenv_values
+    return dotenv_values(path)
+
+
+def __getattr__(name):
+    # `immport.config` reads .env.secrets when first used instead of on import
+    if name == "config":
+        return load_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-config = dotenv_values(".env.secrets")
 
 API_ENDPOINT_BASE_URL = "https://www.immport.org"
 DATA_QUERY_URL = API_ENDPOINT_BASE_URL + "/data/query"
@@ -116,7 +133,9 @@ class immport_queries():
             "password": self.config["password"]
         }
 
-        response = requests.post(url, data=payload)
+        with timed_http("immport/auth/token", "POST") as call:
+            response = requests.post(url, data=payload)
+            call.record_response(response)
 
         if response.status_code == 200:
             print('Authentication successful')
@@ -140,7 +159,10 @@ class immport_queries():
             "Authorization": f"bearer {self.auth}"
         }
 
-        response = requests.get(url, headers=headers)
+        # ids in the endpoint (tickets, workspaces) are replaced to keep the metric labels few
+        with timed_http("immport/" + re.sub(r"\d+", "{id}", endpoint.strip("/")), "GET") as call:
+            response = requests.get(url, headers=headers)
+            call.record_response(response)
 
         if response.status_code == 200:
             self.request_history.append(response)
@@ -238,7 +260,9 @@ class immport_queries():
             
             # Make a POST request with multipart form data
             print(f"Uploading file: {file_path.name}")
-            response = requests.post(url, headers=self.headers, data=payload, files=files)
+            with timed_http("immport/data/upload", "POST") as call:
+                response = requests.post(url, headers=self.headers, data=payload, files=files)
+                call.record_response(response)
             self.request_history.append(response)
         
         if response.status_code == 200:
@@ -264,7 +288,9 @@ class immport_queries():
         }
 
         # Make a POST request with multipart form data
-        response = requests.post(url, headers=self.headers, data=payload)
+        with timed_http("immport/data/upload/validation", "POST") as call:
+            response = requests.post(url, headers=self.headers, data=payload)
+            call.record_response(response)
         self.request_history.append(response)
         return response
 
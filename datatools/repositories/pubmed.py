@@ -1,8 +1,11 @@
 """ Pubmed repository functions """
 
-from Bio import Entrez
+from __future__ import annotations
 from datetime import datetime
-import pandas as pd
+from datatools.utils.lazy import lazy_import
+
+Entrez = lazy_import("Bio.Entrez")
+pd = lazy_import("pandas")
 
 def esearch(db, query):
     handle = Entrez.esearch(db, term=query, retmax=100)
@@ -1,10 +1,15 @@
 
-import requests
+from __future__ import annotations
 import json
 from dataclasses import dataclass
-import pandas as pd
 import re
 from datatools.utils.utils import check_file
+from datatools.utils.names import transform_name, transform_names
+from datatools.utils.metrics import timed_http
+from datatools.utils.lazy import lazy_import
+
+requests = lazy_import("requests")
+pd = lazy_import("pandas")
 
 class redcap_submissions(): 
     def __init__(self, token): 
@@ -13,7 +18,9 @@ class redcap_submissions():
     
     def post(self, data: dict, **kwargs): 
         try: 
-            r = requests.post(self.base_url,timeout=30, data = data, **kwargs)
+            with timed_http(f"redcap/{data.get('content', '')}", "POST") as call: 
+                r = requests.post(self.base_url,timeout=30, data = data, **kwargs)
+                call.record_response(r)
             r.raise_for_status()
             print(f'HTTP Status: {r.status_code}')
             return r.json()
@@ -101,9 +108,11 @@ class redcap_worker():
         #     "returnFormat": "json",
         # }
         try:
-            r = requests.post(
-                "https://redcap.seattlechildrens.org/api/", data=data, timeout=10
-            )
+            with timed_http(f"redcap/{data.get('content', '')}", "POST") as call:
+                r = requests.post(
+                    "https://redcap.seattlechildrens.org/api/", data=data, timeout=10
+                )
+                call.record_response(r)
             r.raise_for_status()
             print(f"HTTP Status: {r.status_code}")
             return r.json()
@@ -131,7 +140,9 @@ class redcap_worker():
             'returnFormat': 'json'
         }
 
-        r = requests.post(url,data=fields)
+        with timed_http("redcap/record", "POST") as call: 
+            r = requests.post(url,data=fields)
+            call.record_response(r)
         print('HTTP Status: ' + str(r.status_code))
         if r.status_code == 200: 
             return r.text
@@ -235,21 +246,7 @@ def template_col_mapper(template):
     for word in template['properties'].keys(): 
         if " " in word: 
             continue
-        
-        new_word = ""
-        for i, letter in enumerate(word): 
-            if i == 0: 
-                new_word += letter.upper()
-            else: 
-                if letter.isupper(): 
-                    new_word += " " + letter 
-                else: 
-                    new_word += letter
-        
-        if bool(re.search('id', word, flags=re.IGNORECASE)): 
-            new_word = re.sub('id', 'ID', new_word, flags=re.IGNORECASE)
-        # print(word, ":", new_word)
-        mapper[word] = new_word
+        mapper[word] = transform_name(word, "immport")
 
     return mapper
 
@@ -302,24 +299,9 @@ def get_response_status(response):
 
 def basic_cleanup(df, mapper, instrument_name): 
     """ For cleaning up dataframes to match the immport templates """
-    df.columns = [re.sub(instrument_name, '', t).strip("_") for t in df.columns]
-    
-    new_col_names = []
-    
-    for i, c in enumerate(df.columns):
-        temp = c.split('_')
-        for i2, x in enumerate(temp): 
-            if i2 != 0: 
-                temp[i2] = ''.join([x[0].upper(), x[1:]])
-        
-        temp = ''.join(temp)
-            
-        new_col_names.append(temp)
-        
-    # print(new_col_names)
-    
-    df.columns = new_col_names
-    # display(df)
+    instrument = re.compile(instrument_name)
+    df.columns = [instrument.sub('', t).strip("_") for t in df.columns]
+    df.columns = transform_names(df.columns, "snake_to_camel")
     
     for c in mapper.keys():
         if c not in df.columns:
@@ -0,0 +1,10 @@
+from datatools.utils.lazy import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=[
+        "cache", "checksums", "cleaning", "lazy", "metrics", "names", "profiling",
+        "uncat", "utils", "xml_helpers", "zip_builder", "zooma",
+    ],
+    attributes={"apply_to_list": "datatools.utils.utils:apply_to_list"},
+)
@@ -0,0 +1,292 @@
+""" On-disk caches: DataFrames computed from files, e.g. microscopy metadata, and API responses """
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from datatools.utils import metrics
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+
+def partial_hash(file_path, n_bytes: int = 1024 * 1024) -> str:
+    """
+    Hash the first and last `n_bytes` of a file. Catches files rewritten in place with the same size and mtime
+    without reading whole image files.
+
+    Args:
+        file_path (str): Path to the file.
+        n_bytes (int): Number of bytes to read from each end of the file.
+
+    Returns:
+        str: Hex digest.
+    """
+    h = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        h.update(f.read(n_bytes))
+        size = f.seek(0, os.SEEK_END)
+        if size > n_bytes:
+            f.seek(max(n_bytes, size - n_bytes))
+            h.update(f.read(n_bytes))
+    return h.hexdigest()
+
+
+class file_cache:
+    """
+    Content-addressed cache of DataFrames keyed by the source file.
+
+    Entries are keyed by the file's absolute path, size, mtime and optionally a partial content hash, so an entry
+    is only found while the file is unchanged. Results are stored as parquet files in `cache_dir` and indexed
+    in a small SQLite table, and the least recently used entries are evicted once the cache grows past `max_bytes`.
+
+    Example:
+        cache = file_cache("./.md_cache")
+        md_df = cache.cached("image.lif", "metadata", lambda: lif_file_processor("image.lif").md_df)
+    """
+
+    def __init__(self, cache_dir, max_bytes: int = 1024**3, hash_bytes: int = None):
+        """
+        Args:
+            cache_dir (str): Directory for the cache. Created if it does not exist.
+            max_bytes (int): Size cap for the stored results.
+            hash_bytes (int): If set, add a hash of this many bytes from each end of the file to the key.
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hash_bytes = hash_bytes
+        self.db = sqlite3.connect(self.cache_dir / "index.sqlite", timeout=30)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, file_path TEXT, kind TEXT, nbytes INTEGER, last_access REAL)"
+        )
+        self.db.commit()
+
+    def file_key(self, file_path, kind: str) -> str:
+        """ Key for a result of `kind` computed from the current contents of `file_path` """
+        st = os.stat(file_path)
+        parts = [os.path.abspath(file_path), str(st.st_size), str(st.st_mtime_ns), kind]
+        if self.hash_bytes:
+            parts.append(partial_hash(file_path, self.hash_bytes))
+        return hashlib.sha1("\0".join(parts).encode()).hexdigest()
+
+    def _data_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def get(self, file_path, kind: str) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: The cached result, or None if there is no entry for the file as it is now.
+        """
+        key = self.file_key(file_path, kind)
+        row = self.db.execute("SELECT key FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            df = pd.read_parquet(self._data_path(key))
+        except OSError:
+            self._delete(key)
+            return None
+        self.db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        return df
+
+    def put(self, file_path, kind: str, df: pd.DataFrame) -> bool:
+        """
+        Store a result. Stale entries for the same file and kind are replaced.
+
+        Returns:
+            bool: False if the frame could not be written as parquet (e.g. mixed-type object columns).
+        """
+        key = self.file_key(file_path, kind)
+        data_path = self._data_path(key)
+        try:
+            df.to_parquet(data_path, index=False)
+        except (ValueError, TypeError) as e:
+            print(f"Could not cache {kind} for {file_path}: {e}")
+            return False
+
+        stale = self.db.execute(
+            "SELECT key FROM entries WHERE file_path = ? AND kind = ? AND key != ?",
+            (os.path.abspath(file_path), kind, key),
+        ).fetchall()
+        for (stale_key,) in stale:
+            self._delete(stale_key, commit=False)
+
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+            (key, os.path.abspath(file_path), kind, data_path.stat().st_size, time.time()),
+        )
+        self.db.commit()
+        self.evict()
+        return True
+
+    def cached(self, file_path, kind: str, func) -> pd.DataFrame:
+        """ Return the cached result for the file, or compute it with `func()` and store it """
+        df = self.get(file_path, kind)
+        if df is None:
+            df = func()
+            self.put(file_path, kind, df)
+        return df
+
+    def size(self) -> int:
+        """ Total bytes of the stored results """
+        return self.db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache is under `max_bytes` """
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        for key, nbytes in self.db.execute("SELECT key, nbytes FROM entries ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(key, commit=False)
+            total -= nbytes
+        self.db.commit()
+
+    def clear(self):
+        """ Remove every entry """
+        for (key,) in self.db.execute("SELECT key FROM entries").fetchall():
+            self._delete(key, commit=False)
+        self.db.commit()
+
+    def _delete(self, key: str, commit: bool = True):
+        self._data_path(key).unlink(missing_ok=True)
+        self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if commit:
+            self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class ttl_cache:
+    """
+    SQLite key-value cache for API responses, with a time to live and a size cap.
+
+    Values are stored as JSON. Entries older than `ttl` seconds count as misses and are replaced on the next put,
+    and the least recently used entries are evicted once there are more than `max_entries`. Hits, misses and
+    evictions are counted in `stats()` and in the metrics module when it is enabled.
+
+    Example:
+        cache = ttl_cache("./.zooma_cache.sqlite", namespace="zooma", ttl=7 * 24 * 3600)
+        value = cache.get("lung")
+        if value is None:
+            value = lookup("lung")
+            cache.put("lung", value)
+    """
+
+    def __init__(self, db_path, namespace: str = "default", ttl: float = 30 * 24 * 3600, max_entries: int = 100_000):
+        """
+        Args:
+            db_path (str): SQLite file. Created with its directory if it does not exist.
+            namespace (str): Keeps several caches apart in one file.
+            ttl (float): Seconds an entry stays valid. None never expires entries.
+            max_entries (int): Size cap for the namespace.
+        """
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.db = sqlite3.connect(db_path, timeout=30)
+        # every hit updates last_access, so avoid a full sync per commit
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "namespace TEXT, key TEXT, value TEXT, created REAL, last_access REAL, PRIMARY KEY (namespace, key))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (namespace, last_access)")
+        self.db.commit()
+
+    def _count(self, result: str):
+        metrics.inc("cache_requests_total", cache=self.namespace, result=result)
+
+    def get(self, key: str):
+        """
+        Returns:
+            The stored value, or None if there is no entry or it is older than the ttl.
+        """
+        row = self.db.execute(
+            "SELECT value, created FROM responses WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        now = time.time()
+        if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+            self.misses += 1
+            if row is not None:
+                self.expired += 1
+            self._count("miss" if row is None else "expired")
+            return None
+        self.db.execute(
+            "UPDATE responses SET last_access = ? WHERE namespace = ? AND key = ?", (now, self.namespace, key)
+        )
+        self.db.commit()
+        self.hits += 1
+        self._count("hit")
+        return json.loads(row[0])
+
+    def put(self, key: str, value):
+        """ Store a JSON-serializable value, replacing any entry for the key """
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value, default=str), now, now),
+        )
+        self.db.commit()
+        self.evict()
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM responses WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+    def evict(self):
+        """ Remove the least recently used entries until there are at most `max_entries` """
+        excess = len(self) - self.max_entries
+        if excess <= 0:
+            return
+        self.db.execute(
+            "DELETE FROM responses WHERE namespace = ? AND key IN "
+            "(SELECT key FROM responses WHERE namespace = ? ORDER BY last_access LIMIT ?)",
+            (self.namespace, self.namespace, excess),
+        )
+        self.db.commit()
+        self.evictions += excess
+        metrics.inc("cache_evictions_total", excess, cache=self.namespace)
+
+    def purge_expired(self) -> int:
+        """ Remove entries older than the ttl. Returns the number removed """
+        if self.ttl is None:
+            return 0
+        cursor = self.db.execute(
+            "DELETE FROM responses WHERE namespace = ? AND created < ?", (self.namespace, time.time() - self.ttl)
+        )
+        self.db.commit()
+        return cursor.rowcount
+
+    def clear(self):
+        """ Remove every entry in the namespace """
+        self.db.execute("DELETE FROM responses WHERE namespace = ?", (self.namespace,))
+        self.db.commit()
+
+    def stats(self) -> dict:
+        """ Hits, misses (including expired entries), evictions and the entry count since this cache was opened """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "entries": len(self),
+        }
+
+    def close(self):
+        self.db.close()
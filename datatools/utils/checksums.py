@@ -0,0 +1,170 @@
+""" Checksums and checksum manifests for data repository submissions """
+
+from __future__ import annotations
+import csv
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+tqdm = lazy_import("tqdm")
+
+CHUNK_SIZE = 8 * 1024 * 1024
+default_algorithms = ("md5", "sha256")
+manifest_columns = ["path", "size", "mtime"] # followed by one column per algorithm
+
+
+class multi_digest:
+    """ Updates several hashlib digests from the same reads """
+
+    def __init__(self, algorithms=default_algorithms):
+        self.algorithms = list(algorithms)
+        self.hashers = [hashlib.new(a) for a in self.algorithms]
+
+    def update(self, data):
+        for h in self.hashers:
+            h.update(data)
+
+    def hexdigests(self) -> dict:
+        return {a: h.hexdigest() for a, h in zip(self.algorithms, self.hashers)}
+
+
+def hash_file(file_path, algorithms=default_algorithms, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Compute several checksums of a file in a single read.
+
+    Reads into one reusable buffer in large chunks. hashlib releases the GIL while hashing,
+    so this can run on a thread pool (see checksum_files).
+
+    Args:
+        file_path (str): Path to the file.
+        algorithms (list): hashlib algorithm names.
+        chunk_size (int): Bytes per read.
+
+    Returns:
+        dict: Hex digest for each algorithm.
+    """
+    digest = multi_digest(algorithms)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while n := f.readinto(buffer):
+            digest.update(view[:n])
+    return digest.hexdigests()
+
+
+def read_manifest(manifest_path) -> dict:
+    """
+    Reads a checksum manifest written by checksum_files.
+
+    Returns:
+        dict: Rows keyed by path. Later rows for the same path win, so an interrupted run can be resumed.
+    """
+    rows = {}
+    if not os.path.exists(manifest_path):
+        return rows
+    with open(manifest_path, newline="") as f:
+        for row in csv.DictReader(f):
+            rows[row["path"]] = row
+    return rows
+
+
+def _manifest_header(manifest_path) -> list:
+    """ Column names of an existing manifest, None if there is no manifest or it is empty """
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, newline="") as f:
+        return next(csv.reader(f), None)
+
+
+def _write_manifest(manifest_path, columns: list, rows):
+    """ Replace the manifest with `rows`, via a temporary file so it is never left half written """
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temp_path, manifest_path)
+
+
+def _is_current(row: dict, size: int, mtime: int, algorithms) -> bool:
+    if row is None:
+        return False
+    if row.get("size") != str(size) or row.get("mtime") != str(mtime):
+        return False
+    return all(row.get(a) for a in algorithms)
+
+
+def _hash_entry(file_path, algorithms, chunk_size) -> dict:
+    st = os.stat(file_path)
+    return {"path": str(file_path), "size": str(st.st_size), "mtime": str(st.st_mtime_ns)} | hash_file(file_path, algorithms, chunk_size)
+
+
+def checksum_files(file_paths: list, manifest_path=None, algorithms=default_algorithms, workers: int = 8, chunk_size: int = CHUNK_SIZE, progress: bool = True) -> pd.DataFrame:
+    """
+    Checksum many files on a thread pool and keep a resumable manifest.
+
+    The manifest is a csv of path, size, mtime (ns) and one column per algorithm. Files whose size and mtime
+    match the manifest are not read again. Rows are appended as each file finishes, so an interrupted run
+    picks up where it stopped, and the manifest is rewritten without duplicates at the end. A manifest with
+    other algorithm columns is rewritten with the new columns before any rows are appended.
+
+    Args:
+        file_paths (list): Files to checksum.
+        manifest_path (str): csv manifest to read and update. Optional.
+        algorithms (list): hashlib algorithm names.
+        workers (int): Number of threads.
+        chunk_size (int): Bytes per read.
+        progress (bool): Show a progress bar.
+
+    Returns:
+        pd.DataFrame: One row per file with the manifest columns.
+    """
+    algorithms = list(algorithms)
+    columns = manifest_columns + algorithms
+    manifest = read_manifest(manifest_path) if manifest_path is not None else {}
+
+    results = {}
+    pending = []
+    for file_path in file_paths:
+        st = os.stat(file_path)
+        row = manifest.get(str(file_path))
+        if _is_current(row, st.st_size, st.st_mtime_ns, algorithms):
+            results[str(file_path)] = {c: row[c] for c in columns}
+        else:
+            pending.append(file_path)
+
+    if len(file_paths) > 0:
+        print(f"Checksumming {len(pending)} of {len(file_paths)} files")
+
+    writer = None
+    manifest_file = None
+    if manifest_path is not None and len(pending) > 0:
+        header = _manifest_header(manifest_path)
+        if header is not None and header != columns:
+            _write_manifest(manifest_path, columns, manifest.values()) # so the appended rows line up with the header
+        manifest_file = open(manifest_path, "a", newline="")
+        writer = csv.DictWriter(manifest_file, fieldnames=columns, extrasaction="ignore")
+        if header is None:
+            writer.writeheader()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_hash_entry, f, algorithms, chunk_size) for f in pending]
+            for future in tqdm.tqdm(as_completed(futures), total=len(futures), desc="Checksumming files...", disable=not progress):
+                entry = future.result()
+                results[entry["path"]] = entry
+                if writer is not None:
+                    writer.writerow(entry)
+                    manifest_file.flush()
+    finally:
+        if manifest_file is not None:
+            manifest_file.close()
+
+    if manifest_path is not None:
+        manifest.update(results)
+        _write_manifest(manifest_path, columns, manifest.values())
+
+    df = pd.DataFrame([results[str(f)] for f in file_paths], columns=columns)
+    return df.astype({"size": "int64", "mtime": "int64"})
@@ -0,0 +1,153 @@
+""" Vectorized string cleaning for exported tables (REDCap, ImmPort templates) """
+
+from __future__ import annotations
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+pa = lazy_import("pyarrow")
+
+string_dtype = "string[pyarrow]"
+
+# same characters as utils.remove_special_characters. pyarrow uses RE2, where \s is ASCII only,
+# so the other characters Python counts as whitespace are listed explicitly
+_special_characters = r"[^a-zA-Z0-9\t\n\v\f\r\x1c-\x1f\x85\p{Z}]"
+
+
+def strip(s: pd.Series) -> pd.Series:
+    """ Leading and trailing spaces, as str.strip(" ") """
+    return s.str.strip(" ")
+
+
+def collapse_whitespace(s: pd.Series) -> pd.Series:
+    """ Runs of whitespace become one space """
+    return s.str.replace(r"\s+", " ", regex=True)
+
+
+def remove_special_characters(s: pd.Series) -> pd.Series:
+    """ Everything except letters, digits and whitespace, as utils.remove_special_characters """
+    return s.str.replace(_special_characters, "", regex=True)
+
+
+def empty_to_na(s: pd.Series) -> pd.Series:
+    """ Empty strings become NA """
+    return s.mask(s == "")
+
+
+steps = {
+    "strip": strip,
+    "collapse_whitespace": collapse_whitespace,
+    "remove_special_characters": remove_special_characters,
+    "empty_to_na": empty_to_na,
+}
+default_steps = ("strip", "empty_to_na")
+
+
+def _resolve(pipeline) -> list:
+    """ Step names or callables taking and returning a string Series """
+    if isinstance(pipeline, str):
+        pipeline = [pipeline]
+    resolved = []
+    for step in pipeline:
+        if callable(step):
+            resolved.append(step)
+        elif step in steps:
+            resolved.append(steps[step])
+        else:
+            raise ValueError(f"Unknown cleaning step: {step}. Must be one of {list(steps)} or a function")
+    return resolved
+
+
+def string_columns(df: pd.DataFrame) -> list:
+    """ Columns with a string dtype, or object columns holding only strings (and missing values) """
+    cols = []
+    for c in df.columns:
+        dtype = df[c].dtype
+        if isinstance(dtype, pd.StringDtype):
+            cols.append(c)
+        elif dtype == object and pd.api.types.infer_dtype(df[c], skipna=True) == "string":
+            cols.append(c)
+    return cols
+
+
+def clean_series(s: pd.Series, pipeline=default_steps) -> pd.Series:
+    """
+    Run cleaning steps on one column with pyarrow string operations.
+
+    Args:
+        s (pd.Series): Strings, missing values are kept as NA.
+        pipeline (list): Step names from `steps` or functions, applied in order.
+
+    Returns:
+        pd.Series: Cleaned column with the "string[pyarrow]" dtype.
+    """
+    s = s.astype(string_dtype)
+    for step in _resolve(pipeline):
+        s = step(s)
+    return s
+
+
+def clean_frame(df: pd.DataFrame, pipeline=default_steps, columns: list = None) -> pd.DataFrame:
+    """
+    Run cleaning steps on the string columns of a table.
+
+    Args:
+        df (pd.DataFrame): Table to clean. Not modified.
+        pipeline (list): Step names from `steps` or functions, applied in order.
+        columns (list): Columns to clean. Defaults to string_columns(df).
+
+    Returns:
+        pd.DataFrame: Copy with the cleaned columns as "string[pyarrow]".
+    """
+    pipeline = _resolve(pipeline)
+    if columns is None:
+        columns = string_columns(df)
+    return df.assign(**{c: clean_series(df[c], pipeline) for c in columns})
+
+
+def clean_chunks(chunks, pipeline=default_steps, columns: list = None):
+    """
+    Clean an iterator of tables one at a time, so memory stays at one chunk.
+
+    Example:
+        for chunk in clean_chunks(read_csv_chunks("export.csv"), ["strip", "collapse_whitespace", "empty_to_na"]):
+            chunk.to_csv("clean.csv", mode="a", header=False, index=False)
+
+    Args:
+        chunks (iterable): DataFrames, e.g. a pd.read_csv reader with chunksize.
+        pipeline (list): Step names from `steps` or functions, applied in order.
+        columns (list): Columns to clean. Defaults to the string columns of each chunk.
+
+    Yields:
+        pd.DataFrame: Each cleaned chunk.
+    """
+    pipeline = _resolve(pipeline)
+    for chunk in chunks:
+        yield clean_frame(chunk, pipeline, columns)
+
+
+def read_csv_chunks(file_path, block_size: int = 16 * 1024 * 1024, convert_options=None):
+    """
+    Stream a csv as DataFrames with pyarrow-backed string columns, one block at a time.
+
+    Strings stay in Arrow memory, so clean_chunks does not have to convert Python objects first.
+    A pd.read_csv reader with chunksize works with clean_chunks as well, but is slower to clean.
+
+    Args:
+        file_path (str): Path to the csv.
+        block_size (int): Bytes per block. Memory stays around one block.
+        convert_options (pyarrow.csv.ConvertOptions): Column types etc. Types are inferred from the first block
+            otherwise, e.g. pass ConvertOptions(column_types={"record_id": pa.string()}) for columns that change type later.
+
+    Yields:
+        pd.DataFrame: One chunk per block.
+    """
+    import pyarrow.csv as pa_csv
+
+    string_types = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=convert_options,
+    )
+    for batch in reader:
+        yield batch.to_pandas(types_mapper=string_types.get)
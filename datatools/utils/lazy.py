@@ -0,0 +1,72 @@
+""" Lazy imports, so importing datatools does not load pandas, h5py, readlif etc. until they are used """
+
+import importlib
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """
+    Module that is only executed on first attribute access.
+
+    Example:
+        h5py = lazy_import("h5py")  # nothing loaded yet
+        h5py.File(path)             # loads h5py here
+
+    Importing a submodule (e.g. 'pyarrow.csv') still imports its parent package right away,
+    so import those inside the functions that use them instead.
+
+    Args:
+        name (str): Module name.
+
+    Returns:
+        module: The module, loaded on first use.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def attach(package_name: str, submodules=(), attributes: dict = None):
+    """
+    PEP 562 __getattr__ and __dir__ for a package, importing submodules and attributes on first access.
+
+    Example (in a package __init__.py):
+        __getattr__, __dir__, __all__ = attach(__name__, submodules=["flow", "microscopy"])
+
+    Args:
+        package_name (str): __name__ of the package.
+        submodules (list): Submodules of the package.
+        attributes (dict): Other names, mapped to 'module' or 'module:attribute'.
+
+    Returns:
+        (function, function, list): __getattr__, __dir__ and __all__ for the package.
+    """
+    submodules = set(submodules)
+    attributes = dict(attributes or {})
+    names = sorted(submodules | set(attributes))
+
+    def __getattr__(name):
+        if name in submodules:
+            return importlib.import_module(f"{package_name}.{name}")
+        if name in attributes:
+            module_name, _, attribute = attributes[name].partition(":")
+            value = importlib.import_module(module_name)
+            if attribute:
+                value = getattr(value, attribute)
+            setattr(sys.modules[package_name], name, value) # later lookups skip __getattr__
+            return value
+        raise AttributeError(f"module {package_name!r} has no attribute {name!r}")
+
+    def __dir__():
+        return names
+
+    return __getattr__, __dir__, names
@@ -0,0 +1,399 @@
+""" Timing, counters and histograms for HTTP calls and file parsing, and non-blocking logging
+
+Metrics are off unless the DATATOOLS_METRICS environment variable is set (or enable() is called). While off,
+timed, timed_http and timed_file return right away without reading the clock.
+
+Each process has its own registry. Code that hands work to other processes records it with isolated() there and
+sends the snapshot back to merge(), as harvest_directory does for its workers.
+
+Example:
+    from datatools.utils import metrics
+    metrics.enable()
+    harvest_directory("./images")
+    print(metrics.to_prometheus())
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+enabled = os.environ.get("DATATOOLS_METRICS", "").lower() in ("1", "true", "yes", "on")
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+log_format = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+def enable(flag: bool = True):
+    """ Turn metrics collection on or off """
+    global enabled
+    enabled = flag
+
+
+class histogram:
+    """ Cumulative bucket counts, sum and count, as in a Prometheus histogram """
+
+    def __init__(self, buckets=default_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "buckets": dict(zip(self.buckets, self.counts)),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+class registry:
+    """ Thread-safe store of counters and histograms keyed by name and labels """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets=default_buckets, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        """ Picklable copy of the counters and histograms, for merge() in another process """
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {k: (h.buckets, list(h.counts), h.sum, h.count) for k, h in self.histograms.items()},
+            }
+
+    def merge(self, snapshot: dict):
+        """ Add a snapshot() from another registry """
+        with self.lock:
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (buckets, counts, total, count) in snapshot["histograms"].items():
+                if key not in self.histograms:
+                    self.histograms[key] = histogram(buckets)
+                h = self.histograms[key]
+                if h.buckets != tuple(buckets):
+                    raise ValueError(f"Cannot merge histograms with different buckets: {key[0]}")
+                h.counts = [a + b for a, b in zip(h.counts, counts)]
+                h.sum += total
+                h.count += count
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in self.counters.items()],
+                "histograms": [{"name": n, "labels": dict(l)} | h.to_dict() for (n, l), h in self.histograms.items()],
+            }
+
+    def to_prometheus(self) -> str:
+        """ Prometheus text exposition format """
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{label_text(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items(), key=lambda x: x[0]):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for bound, count in zip(h.buckets, h.counts):
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {h.count}")
+                lines.append(f"{name}_sum{label_text(labels)} {h.sum}")
+                lines.append(f"{name}_count{label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = registry()
+
+
+def inc(name: str, value: float = 1, **labels):
+    """ Add to a counter """
+    if enabled:
+        metrics.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels):
+    """ Add an observation to a histogram """
+    if enabled:
+        metrics.observe(name, value, **labels)
+
+
+def to_json() -> str:
+    return json.dumps(metrics.to_dict())
+
+
+def to_prometheus() -> str:
+    return metrics.to_prometheus()
+
+
+def reset():
+    metrics.reset()
+
+
+def merge(snapshot: dict):
+    """ Add metrics recorded in another process (registry.snapshot()) to this one """
+    if snapshot:
+        metrics.merge(snapshot)
+
+
+@contextmanager
+def isolated(flag: bool = None):
+    """
+    Record into a new, empty registry inside the block, e.g. in a worker process. A forked worker starts with a
+    copy of the parent's registry, so its snapshot would otherwise count the parent's metrics twice.
+
+    Example:
+        def worker(file_path, collect):
+            with metrics.isolated(collect) as worker_metrics:
+                ...
+            return result, worker_metrics.snapshot()
+
+    Args:
+        flag (bool): Turn collection on or off inside the block, e.g. the parent's `enabled` for spawned workers.
+            Defaults to the current setting.
+
+    Yields:
+        registry: The registry the block records into.
+    """
+    global metrics, enabled
+    previous, previous_enabled = metrics, enabled
+    metrics = registry()
+    if flag is not None:
+        enabled = flag
+    try:
+        yield metrics
+    finally:
+        metrics, enabled = previous, previous_enabled
+
+
+class timed:
+    """
+    Records the elapsed time in the `{name}_seconds` histogram, as a context manager or a decorator.
+
+    Example:
+        with timed("parse_header", kind="lif"):
+            ...
+
+        @timed("build_table")
+        def build_table(...):
+            ...
+    """
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.start is not None:
+            metrics.observe(f"{self.name}_seconds", time.perf_counter() - self.start, **self.labels)
+            self.start = None
+        return False
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            # a new instance per call, so recursive and threaded calls do not share a start time
+            with timed(self.name, **self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+class _noop_call:
+    """ Stands in for http_call and file_call while metrics are off """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def record_response(self, response):
+        pass
+
+    def retry(self):
+        pass
+
+    def add_bytes(self, n_bytes: int):
+        pass
+
+
+_noop = _noop_call()
+
+
+class http_call:
+    """ Latency, status, bytes, retries and errors of one HTTP call. Created by timed_http """
+
+    def __init__(self, endpoint: str, method: str):
+        self.labels = {"endpoint": endpoint, "method": method}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics.observe("http_request_seconds", time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            metrics.inc("http_errors_total", error=exc_type.__name__, **self.labels)
+        return False
+
+    def record_response(self, response):
+        """ Status, body size and urllib3 retries of a requests.Response """
+        metrics.inc("http_requests_total", status=str(response.status_code), **self.labels)
+        size = response.headers.get("Content-Length")
+        if size is None and isinstance(getattr(response, "_content", None), bytes):
+            size = len(response._content)
+        if size is not None:
+            metrics.inc("http_response_bytes_total", int(size), **self.labels)
+        retries = getattr(getattr(response.raw, "retries", None), "history", None)
+        if retries:
+            metrics.inc("http_retries_total", len(retries), **self.labels)
+
+    def retry(self):
+        """ Count a retry made by the caller """
+        metrics.inc("http_retries_total", **self.labels)
+
+    def add_bytes(self, n_bytes: int):
+        metrics.inc("http_response_bytes_total", n_bytes, **self.labels)
+
+
+def timed_http(endpoint: str, method: str = "GET"):
+    """
+    Context manager for one HTTP call. Use a low-cardinality endpoint label (no record or ticket ids).
+
+    Example:
+        with timed_http("zooma/services/annotate", "GET") as call:
+            response = requests.get(url, params=params)
+            call.record_response(response)
+    """
+    return http_call(endpoint, method) if enabled else _noop
+
+
+class file_call:
+    """ Parse time and size of one file. Created by timed_file """
+
+    def __init__(self, file_path, kind: str):
+        self.file_path = file_path
+        self.labels = {"kind": kind}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics.observe("file_parse_seconds", time.perf_counter() - self.start, **self.labels)
+        metrics.inc("files_parsed_total", status="error" if exc_type else "ok", **self.labels)
+        try:
+            metrics.inc("file_parse_bytes_total", os.path.getsize(self.file_path), **self.labels)
+        except (OSError, TypeError):
+            pass
+        return False
+
+    def add_bytes(self, n_bytes: int):
+        metrics.inc("file_parse_bytes_total", n_bytes, **self.labels)
+
+
+def timed_file(file_path, kind: str):
+    """
+    Context manager timing the parsing of one file, by file kind (e.g. 'lif', 'ims', 'wsp').
+
+    Example:
+        with timed_file(file_path, "lif"):
+            header = read_lif_header(file_path)
+    """
+    return file_call(file_path, kind) if enabled else _noop
+
+
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def _stop_listeners():
+    for listener in _listeners.values():
+        listener.stop()
+    _listeners.clear()
+
+
+atexit.register(_stop_listeners)
+
+
+def get_logger(name: str = "datatools", log_file: str = None, level=logging.INFO) -> logging.Logger:
+    """
+    Logger that hands records to a queue. A background QueueListener writes them to the file (or stderr),
+    so logging does not block on I/O. Calling it again with the same name and file reuses the same handlers.
+
+    Args:
+        name (str): Logger name.
+        log_file (str): File to write to. Defaults to stderr.
+        level: Logging level.
+
+    Returns:
+        logging.Logger
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    key = (name, os.path.abspath(log_file) if log_file else None)
+    with _listeners_lock:
+        if key not in _listeners:
+            handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(log_format))
+            log_queue = queue.SimpleQueue()
+            listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+            listener.start()
+            _listeners[key] = listener
+            logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        for handler in _listeners[key].handlers:
+            handler.setLevel(level)
+    return logger
@@ -0,0 +1,102 @@
+""" Column name transformations shared by the REDCap, ImmPort and template helpers """
+
+from __future__ import annotations
+import re
+from functools import lru_cache
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+_special_characters = re.compile(r"[^a-zA-Z0-9\s]")
+_field_separators = re.compile(r"\*|\(|\)|-|/|,| ")
+_double_underscore = re.compile(r"_{2}")
+_multiple_spaces = re.compile(r" {2,}")
+_id = re.compile(r"id", flags=re.IGNORECASE)
+
+
+def _split_on_upper(word: str) -> str:
+    """ First letter upper case and a space before every other upper case letter, e.g. 'subjectAge' -> 'Subject Age' """
+    if word == "":
+        return word
+    return word[0].upper() + "".join(" " + letter if letter.isupper() else letter for letter in word[1:])
+
+
+def _field_name(name: str) -> str:
+    new_name = _field_separators.sub("_", name).strip()
+    return _double_underscore.sub("_", new_name)
+
+
+def _snake_case(name: str) -> str:
+    word = _special_characters.sub("", name)
+    new_word = word.replace(" ", "_").lower()
+    return _id.sub("Id", new_word) if _id.search(word) else new_word
+
+
+def _human_readable(name: str) -> str:
+    word = _special_characters.sub("", name)
+    if " " not in word:
+        new_word = _split_on_upper(word)
+    else:
+        new_word = _multiple_spaces.sub(" ", word.replace("_", " "))
+    return _id.sub("Id", new_word) if _id.search(word) else new_word
+
+
+def _camel_case(name: str) -> str:
+    word = _special_characters.sub("", name).replace(" ", "")
+    new_word = word[:1].lower() + word[1:]
+    return _id.sub("Id", new_word) if _id.search(word) else new_word
+
+
+def _snake_to_camel(name: str) -> str:
+    first, *rest = name.split("_")
+    return first + "".join(part[:1].upper() + part[1:] for part in rest)
+
+
+def _immport(name: str) -> str:
+    new_word = _split_on_upper(name)
+    return _id.sub("ID", new_word) if _id.search(name) else new_word
+
+
+cases = {
+    "field_name": _field_name, # 'Sample (ID)-1' -> 'Sample_ID_1', as clean_field_names
+    "snake_case": _snake_case, # 'Sample Name' -> 'sample_name', as col_renamer
+    "human_readable": _human_readable, # 'sampleName' -> 'Sample Name', as col_renamer
+    "camel_case": _camel_case, # 'Sample Name' -> 'sampleName', as json_col_mapper
+    "snake_to_camel": _snake_to_camel, # 'sample_name' -> 'sampleName', as adjust_redcap_cols
+    "immport": _immport, # 'subjectId' -> 'Subject ID', as template_col_mapper
+}
+
+
+@lru_cache(maxsize=65536)
+def transform_name(name: str, case: str) -> str:
+    """
+    Transform one column name. Results are cached, so repeated names across templates and exports are only computed once.
+
+    Args:
+        name (str): Column name.
+        case (str): One of `cases`.
+
+    Returns:
+        str: The transformed name.
+    """
+    if case not in cases:
+        raise ValueError(f"Case must be one of {list(cases)}")
+    return cases[case](name)
+
+
+def transform_names(names, case: str):
+    """
+    Transform many column names, e.g. df.columns. Each distinct name is transformed once.
+
+    Args:
+        names (pd.Index or list): Column names.
+        case (str): One of `cases`.
+
+    Returns:
+        pd.Index or list: The transformed names, as a pd.Index if `names` is one.
+    """
+    mapping = {name: transform_name(name, case) for name in dict.fromkeys(names)}
+    new_names = [mapping[name] for name in names]
+    if isinstance(names, pd.Index):
+        return pd.Index(new_names, name=names.name)
+    return new_names
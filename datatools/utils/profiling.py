@@ -0,0 +1,216 @@
+""" One-pass column profiles of large tables (GEO, REDCap exports) with bounded memory """
+
+from __future__ import annotations
+import json
+from datatools.utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+class hyperloglog:
+    """
+    Approximate distinct count from 64-bit hashes, with a relative error of about 1.04 / sqrt(2**p).
+
+    Sketches built over different chunks can be merged.
+    """
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update(self, hashes: np.ndarray):
+        """ Add uint64 hashes, e.g. from pd.util.hash_pandas_object """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        bits = np.uint64(64 - self.p)
+        index = (hashes >> bits).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # rank = trailing zeros + 1, from the lowest set bit (w & -w). All-zero remainders get the maximum rank
+        lowest = rest & (~rest + np.uint64(1))
+        rank = np.full(len(hashes), 64 - self.p + 1, dtype=np.uint8)
+        nonzero = lowest > 0
+        rank[nonzero] = np.log2(lowest[nonzero]).astype(np.uint8) + 1
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "hyperloglog"):
+        if other.p != self.p:
+            raise ValueError("Can only merge sketches with the same precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m**2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros > 0:
+            # linear counting is more accurate for small cardinalities
+            return int(round(self.m * np.log(self.m / zeros)))
+        return int(round(raw))
+
+
+class heavy_hitters:
+    """
+    Misra-Gries summary of the most frequent values with at most `capacity` counters.
+
+    Counts are lower bounds, off by at most `error` (total / (capacity + 1)). Summaries can be merged.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counters = {}
+        self.total = 0
+        self.error = 0
+
+    def update(self, counts: pd.Series):
+        """ Add value counts, e.g. from value_counts() of one chunk """
+        self.total += int(counts.sum())
+        if len(counts) > self.capacity:
+            # the chunk's own summary first, vectorized, so at most `capacity` values reach the dict
+            counts = counts.nlargest(self.capacity + 1)
+            cut = int(counts.iloc[-1])
+            counts = counts.iloc[:-1] - cut
+            counts = counts[counts > 0]
+            self.error += cut
+        for value, count in counts.items():
+            self.counters[value] = self.counters.get(value, 0) + int(count)
+        self._shrink()
+
+    def merge(self, other: "heavy_hitters"):
+        self.total += other.total
+        self.error += other.error
+        for value, count in other.counters.items():
+            self.counters[value] = self.counters.get(value, 0) + count
+        self._shrink()
+
+    def _shrink(self):
+        if len(self.counters) <= self.capacity:
+            return
+        # subtract the (capacity + 1)-th largest count from every counter and drop the ones that reach zero
+        cut = sorted(self.counters.values(), reverse=True)[self.capacity]
+        self.counters = {v: c - cut for v, c in self.counters.items() if c > cut}
+        self.error += cut
+
+    def top(self, k: int) -> list:
+        """ (value, count) for the k largest counters """
+        return sorted(self.counters.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+class column_profiler:
+    """
+    Profiles every column of a table, or of a stream of chunks, in one pass.
+
+    Per column: dtype, row and null counts, approximate distinct count (HyperLogLog) and the most frequent values
+    (Misra-Gries). Memory is fixed per column, so chunks from pd.read_csv(chunksize=...) can be profiled
+    without loading the file.
+
+    Example:
+        profiler = column_profiler(top=5)
+        for chunk in pd.read_csv("export.csv", chunksize=100_000):
+            profiler.update(chunk)
+        report = profiler.report()
+    """
+
+    def __init__(self, top: int = 10, capacity: int = None, p: int = 14):
+        """
+        Args:
+            top (int): Number of frequent values in the report.
+            capacity (int): Counters kept per column for the frequent values. Defaults to 10 * top.
+            p (int): HyperLogLog precision. 2**p registers per column.
+        """
+        self.top = top
+        self.capacity = capacity if capacity is not None else 10 * top
+        self.p = p
+        self.columns = {}
+
+    def _column(self, name) -> dict:
+        if name not in self.columns:
+            self.columns[name] = {
+                "dtypes": [],
+                "count": 0,
+                "null_count": 0,
+                "distinct": hyperloglog(self.p),
+                "frequent": heavy_hitters(self.capacity),
+            }
+        return self.columns[name]
+
+    def update(self, df: pd.DataFrame):
+        """ Add one table or chunk """
+        for name in df.columns:
+            col = df[name]
+            stats = self._column(name)
+            dtype = str(col.dtype)
+            if dtype not in stats["dtypes"]:
+                stats["dtypes"].append(dtype)
+            values = col[col.notna()]
+            stats["count"] += len(col)
+            stats["null_count"] += len(col) - len(values)
+            try:
+                hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+                counts = values.value_counts(sort=False)
+            except TypeError: # unhashable values, e.g. lists
+                values = values.astype(str)
+                hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+                counts = values.value_counts(sort=False)
+            stats["distinct"].update(hashes)
+            stats["frequent"].update(counts)
+        return self
+
+    def merge(self, other: "column_profiler"):
+        """ Combine with a profiler of other chunks, e.g. from another process """
+        for name, theirs in other.columns.items():
+            stats = self._column(name)
+            stats["dtypes"] += [d for d in theirs["dtypes"] if d not in stats["dtypes"]]
+            stats["count"] += theirs["count"]
+            stats["null_count"] += theirs["null_count"]
+            stats["distinct"].merge(theirs["distinct"])
+            stats["frequent"].merge(theirs["frequent"])
+        return self
+
+    def report(self, output: str = "frame"):
+        """
+        Args:
+            output (str): 'frame' for a DataFrame with one row per column, 'json' for a JSON string.
+
+        Returns:
+            pd.DataFrame or str: dtype, count, null_count, null_fraction, distinct_approx, top_values
+            ((value, count) pairs, counts are lower bounds) and top_error (maximum undercount).
+        """
+        rows = []
+        for name, stats in self.columns.items():
+            rows.append({
+                "column": name,
+                "dtype": "/".join(stats["dtypes"]),
+                "count": stats["count"],
+                "null_count": stats["null_count"],
+                "null_fraction": stats["null_count"] / stats["count"] if stats["count"] else np.nan,
+                "distinct_approx": stats["distinct"].estimate(),
+                "top_values": stats["frequent"].top(self.top),
+                "top_error": stats["frequent"].error,
+            })
+        if output == "json":
+            return json.dumps(rows, default=lambda x: x.item() if isinstance(x, np.generic) else str(x))
+        if output != "frame":
+            raise ValueError("output must be either 'frame' or 'json'")
+        return pd.DataFrame(rows).set_index("column")
+
+
+def profile(data, top: int = 10, **kwargs):
+    """
+    Profile a DataFrame or an iterable of DataFrames (e.g. a csv reader with chunksize).
+
+    Args:
+        data (pd.DataFrame or iterable): The table or its chunks.
+        top (int): Number of frequent values per column.
+        **kwargs: Passed to column_profiler (capacity, p).
+
+    Returns:
+        pd.DataFrame: column_profiler.report()
+    """
+    profiler = column_profiler(top=top, **kwargs)
+    if isinstance(data, pd.DataFrame):
+        data = [data]
+    for chunk in data:
+        profiler.update(chunk)
+    return profiler.report()
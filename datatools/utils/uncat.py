@@ -1,29 +1,18 @@
+from __future__ import annotations
 import json
-import pandas as pd
 from glob import glob
 from pathlib import Path
 from datatools import redcap
 from datatools.utils import utils
+from datatools.utils.names import transform_name, transform_names
 import re
+from datatools.utils.lazy import lazy_import
 
-def json_col_mapper(word):
-    """ Using snake case """
-    word = utils.remove_special_characters(word)
-    word = word.replace(' ', "")
-    new_word = ""
-    for i, letter in enumerate(word): 
-        if i == 0: 
-            new_word += letter.lower()
-        else: 
-            if letter.isupper(): 
-                new_word += "" + letter 
-            else: 
-                new_word += letter
-        
-        if bool(re.search('id', word, flags=re.IGNORECASE)): 
-            new_word = re.sub('id', 'Id', new_word, flags=re.IGNORECASE)
+pd = lazy_import("pandas")
 
-    return new_word
+def json_col_mapper(word):
+    """ Using camel case """
+    return transform_name(word, "camel_case")
 
 
 def split_template_sections(template_df: pd.DataFrame, template_name: str): 
@@ -57,17 +46,7 @@ def add_req_cols(df, req_cols):
 
 def adjust_redcap_cols(df): 
     """ Removing the underscores and snake-case column names"""
-    new_cols = []
-    for c in df.columns: 
-        # print(c.split('_'))
-        temp = c.split('_')
-        if len(temp) > 1:
-            for i,t in enumerate(temp[1:], start=1):
-                temp[i] = t[0].upper() + t[1:]
-        
-        new_cols.append(''.join(temp))
-        
-    df.columns = new_cols
+    df.columns = transform_names(df.columns, "snake_to_camel")
     return df
 
 
@@ -1,11 +1,18 @@
+from __future__ import annotations
 from pathlib import Path
 import re
 import logging
-import zipfile
 import os
-import pandas as pd
-import numpy as np
 import hashlib
+from datatools.utils.checksums import hash_file
+from datatools.utils.names import transform_name
+from datatools.utils.cleaning import clean_frame
+from datatools.utils.metrics import get_logger
+from datatools.utils.zip_builder import build_zip
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
 
 def apply_to_list(func):
     def wrapper(*args, **kwargs):
@@ -17,11 +24,10 @@ def apply_to_list(func):
     return wrapper
 
 def clean_str_cols(df):
-    """ Assuming convert_dtypes gets it right """
-    df = df.convert_dtypes()
-    string_cols = df.select_dtypes(include='string')
-    df.loc[:, string_cols.columns] = string_cols.map(lambda x: x.strip(" "))
-    return df
+    """ Assuming convert_dtypes gets it right. See cleaning.clean_frame for more steps and chunked input """
+    # strip first, so object columns go straight to pyarrow strings and convert_dtypes leaves them as they are
+    df = clean_frame(df, ["strip"])
+    return df.convert_dtypes()
 
 def remove_special_characters(input_string):
     # Remove any non-alphanumeric characters (including underscore)
@@ -29,9 +35,7 @@ def remove_special_characters(input_string):
 
 
 def clean_field_names(x: str) -> str:
-    new_name = re.sub(" ", "_", re.sub("\\*|\\(|\\)|-|/|,", "_", x)).strip()
-    new_name = re.sub('_{2}', "_", new_name)
-    return new_name
+    return transform_name(x, "field_name")
 
 @apply_to_list
 def col_renamer(word:str, case: str):
@@ -39,45 +43,7 @@ def col_renamer(word:str, case: str):
     if case not in ['human_readable', 'snake_case']:
         raise ValueError("Case must be either 'human_readable' or 'snake_case'")
     
-    word = utils.remove_special_characters(word)
-    
-    if case == 'human_readable':
-        if not bool(re.search(' ', word)): 
-            for i, letter in enumerate(word): 
-                if i == 0: 
-                    new_word = letter.upper()
-                else: 
-                    if letter.isupper(): 
-                        new_word += " " + letter 
-                    else: 
-                        new_word += letter
-        else:           
-            new_word = word.replace('_', ' ')
-            new_word = re.sub(r' {2,}', ' ', new_word)
-        # new_word = new_word.title()
-        # return new_word
-    
-    elif case == 'snake_case': 
-        word = word.replace(' ', "_")
-        new_word = word.lower()
-        # return new_word
-        
-    else: 
-        word = word.replace(' ', "")
-        new_word = ""
-        for i, letter in enumerate(word): 
-            if i == 0: 
-                new_word += letter.lower()
-            else: 
-                if letter.isupper(): 
-                    new_word += "" + letter 
-                else: 
-                    new_word += letter
-            
-    if bool(re.search('id', word, flags=re.IGNORECASE)): 
-        new_word = re.sub('id', 'Id', new_word, flags=re.IGNORECASE)
-
-    return new_word
+    return transform_name(word, case)
 
 
 def rename_duplicates(df):
@@ -88,25 +54,138 @@ def rename_duplicates(df):
     df.columns = cols
     return df
 
-def drop_duplicate_cols(df: pd.DataFrame) -> pd.DataFrame: 
-    return df.loc[:, ~df.T.duplicated()]
+_number_types = {"integer", "floating", "mixed-integer-float", "boolean"}
+_datetime_types = {"datetime", "datetime64"}
 
-class MyLogger:
-    def __init__(self, log_file="my_log.log", level=logging.INFO):
-        # Create a logger
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(level)
+def _exact(values: np.ndarray, dtype: str) -> np.ndarray: 
+    """ Object array `values` as `dtype`, or None if that would change any value """
+    try: 
+        converted = values.astype(dtype)
+    except (TypeError, ValueError, OverflowError): 
+        return None
+    return converted if (converted.astype(object) == values).all() else None
+
+def _numbers(col: pd.Series) -> tuple: 
+    """
+    (kind, values, missing) for a column of numbers. Whole numbers are kept exact as int64, so integers 
+    above 2**53 are not merged by a float64 round trip; a column with any fraction, inf or int64 overflow 
+    is float64 with -0.0 as 0.0. None if neither holds every value of an object column, e.g. very large Python ints. 
+    """
+    missing = col.isna().to_numpy()
+    if col.dtype == object: 
+        present = col.to_numpy()[~missing]
+        converted = _exact(present, "int64")
+        if converted is None: 
+            converted = _exact(present, "float64")
+        if converted is None: 
+            return None
+        present = converted
+    elif pd.api.types.is_integer_dtype(col) or pd.api.types.is_bool_dtype(col): 
+        present = col.to_numpy(dtype="int64", na_value=0)[~missing]
+    else: 
+        present = col.to_numpy(dtype="float64", na_value=np.nan)[~missing]
+    if present.dtype.kind == "f": 
+        present = present + 0.0 # -0.0 == 0.0, so they have to hash alike
+        if np.isfinite(present).all() and (present == np.round(present)).all() and (np.abs(present) < 2**63).all(): 
+            present = present.astype("int64")
+    values = np.zeros(len(col), dtype=present.dtype)
+    values[~missing] = present
+    return ("int" if present.dtype.kind == "i" else "float"), values, missing
+
+def _canonical(col: pd.Series) -> tuple: 
+    """
+    (kind, values, missing) with one representation per kind of value, so columns that compare equal get equal 
+    values whatever their dtype, as in df.T.duplicated(): numbers (int, Int64, float, bool, object holding numbers) 
+    as in _numbers, naive datetimes as nanoseconds, aware ones as UTC nanoseconds, anything else as objects 
+    with None for missing values. Columns with only missing values are all the same, whatever their dtype. 
+    """
+    if col.isna().all(): 
+        return "missing", np.zeros(len(col), dtype="int64"), np.ones(len(col), dtype=bool)
+    if isinstance(col.dtype, pd.CategoricalDtype) or (col.dtype.kind == "u" and col.max() >= 2**63): 
+        col = col.astype(object) # uint64 above the int64 range as Python ints
+    if col.dtype == object: 
+        inferred = pd.api.types.infer_dtype(col, skipna=True)
+        if inferred in _number_types and (numbers := _numbers(col)) is not None: 
+            return numbers
+        if inferred in _datetime_types: 
+            try: 
+                col = pd.to_datetime(col)
+            except (ValueError, TypeError): # mixed time zones
+                pass
+    elif pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col): 
+        return _numbers(col)
+    if pd.api.types.is_datetime64_any_dtype(col): 
+        missing = col.isna().to_numpy()
+        if col.dt.tz is None: 
+            return "datetime", col.to_numpy("datetime64[ns]").view("int64"), missing
+        # aware datetimes are equal when they are the same instant
+        return "datetime_tz", col.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy("datetime64[ns]").view("int64"), missing
+    values = col.to_numpy(dtype=object)
+    missing = pd.isna(values)
+    values[missing] = None # NaN, NA and NaT hash alike
+    return "object", values, missing
+
+def _column_hashes(kind: str, values: np.ndarray, missing: np.ndarray) -> np.ndarray: 
+    """ Row hashes of the values from _canonical """
+    if kind == "object": 
+        return pd.util.hash_pandas_object(pd.Series(values, dtype=object), index=False).to_numpy()
+    hashes = pd.util.hash_array(values)
+    hashes[missing] = 0 # the values there are placeholders
+    return hashes
+
+def _same_values(a: tuple, b: tuple) -> bool: 
+    """ Element-wise equality of two _canonical columns, with missing values equal to each other """
+    (kind_a, a, missing_a), (kind_b, b, missing_b) = a, b
+    if kind_a != kind_b or not np.array_equal(missing_a, missing_b): 
+        return False
+    try: 
+        return bool((a[~missing_a] == b[~missing_b]).all())
+    except (TypeError, ValueError): 
+        return False
+
+def duplicate_cols_mask(df: pd.DataFrame, chunk_rows: int = 100_000) -> np.ndarray: 
+    """
+    Marks columns whose values repeat an earlier column, like df.T.duplicated() without transposing the frame. 
 
-        # Create a file handler and set the log level
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(level)
+    Each column is hashed in row chunks into one digest, so memory grows with the number of columns 
+    rather than the size of the frame. Only columns with the same digest are compared exactly. 
 
-        # Create a formatter and set it for the file handler
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        file_handler.setFormatter(formatter)
+    Args:
+        df (pd.DataFrame): Table to check.
+        chunk_rows (int): Rows hashed at a time.
 
-        # Add the file handler to the logger
-        self.logger.addHandler(file_handler)
+    Returns:
+        np.ndarray: Boolean mask over the columns, True for duplicates of an earlier column.
+    """
+    mask = np.zeros(df.shape[1], dtype=bool)
+    if len(df) == 0: # no values to compare, df.T.duplicated() marks nothing either
+        return mask
+
+    digests = [hashlib.blake2b(digest_size=16) for _ in range(df.shape[1])]
+    for start in range(0, len(df), chunk_rows): 
+        chunk = df.iloc[start:start + chunk_rows]
+        for i, digest in enumerate(digests): 
+            kind, values, missing = _canonical(chunk.iloc[:, i])
+            digest.update(kind.encode())
+            digest.update(_column_hashes(kind, values, missing).tobytes())
+
+    kept = {} # digest -> positions of the first columns with that digest
+    for i, digest in enumerate(digests): 
+        candidates = kept.setdefault(digest.digest(), [])
+        if any(_same_values(_canonical(df.iloc[:, j]), _canonical(df.iloc[:, i])) for j in candidates): 
+            mask[i] = True
+        else: 
+            candidates.append(i)
+    return mask
+
+def drop_duplicate_cols(df: pd.DataFrame) -> pd.DataFrame: 
+    return df.loc[:, ~duplicate_cols_mask(df)]
+
+class MyLogger:
+    def __init__(self, log_file="my_log.log", level=logging.INFO):
+        # Logger with a queue handler. Records are written to the file by a background listener,
+        # and creating another MyLogger for the same file does not add a second handler
+        self.logger = get_logger(__name__, log_file, level)
 
     def info(self, message):
         self.logger.info(message)
@@ -152,15 +231,11 @@ def check_file(file_path, overwrite='y'):
         return True
 
 
-def zip_files(file_paths, output_zip):
+def zip_files(file_paths, output_zip, **kwargs):
+    """ Zip files into output_zip. See zip_builder.build_zip for the options (compression, workers, manifest_path) """
     checker = check_file(output_zip)
     if checker == True:
-        with zipfile.ZipFile(output_zip, "w") as zipf:
-            for file in file_paths:
-                if os.path.isfile(file):
-                    zipf.write(file, os.path.basename(file))
-                else:
-                    print(f"File not found: {file}")
+        build_zip(file_paths, output_zip, **kwargs)
         print(f"Created file: {str(output_zip)}")
     else:
         print(f"Did not create zipped file: {output_zip}")
@@ -182,10 +257,7 @@ def transform_dict(input_dict):
     return {}
 
 def unique_list_keep_order(l: list): 
-    new_list = []
-    for x in l: 
-        if x not in new_list: 
-            new_list.append(x)
+    new_list = list(dict.fromkeys(l))
     
     if len(new_list) > 0: 
         return '_'.join(new_list)
@@ -198,22 +270,63 @@ def unique_list_sorted(l:list, delimiter: str = ","):
     Returns: str
     """
     try: 
-        result = f'{delimiter}'.join(sorted(list(np.unique(l))))
+        result = f'{delimiter}'.join(sorted(set(l)))
         return result
-    except: 
+    except TypeError: 
         return ''
 
-def value_counts_by_col(df: pd.DataFrame) -> pd.DataFrame: 
-    # Split DataFrame by column
+def group_join_unique(df: pd.DataFrame, by, cols: list = None, ordered: bool = True, sep: str = ",") -> pd.DataFrame: 
+    """
+    Join the unique values of each column per group, for all groups at once. 
+    Vectorized replacement for groupby().agg(unique_list_keep_order) or groupby().agg(unique_list_sorted). 
 
-    columns = df.columns
-    split_dfs = {col: df[[col]].dropna() for col in columns}
+    Duplicates are dropped on (group, value) first, so only one join runs per group and column. 
+    Values are joined as strings and missing values are left out. 
 
-    # Get value counts for each column
-    value_counts = {col: split_df[col].value_counts() for col, split_df in split_dfs.items()}
+    Args:
+        df (pd.DataFrame): Table to aggregate.
+        by (str or list): Column(s) to group by.
+        cols (list): Columns to join. Defaults to every column not in `by`.
+        ordered (bool): Keep the values in order of first appearance (unique_list_keep_order), otherwise sort them (unique_list_sorted).
+        sep (str): Separator between values.
 
-    # Inspect value counts for each column
-    for col, counts in value_counts.items():
+    Returns:
+        pd.DataFrame: One row per group, indexed by `by`. Groups without values in a column get None.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    if cols is None:
+        cols = [c for c in df.columns if c not in by]
+
+    index = df[by].drop_duplicates().dropna().set_index(by).sort_index().index
+    joined = {}
+    for col in cols:
+        values = df[by + [col]].dropna()
+        values = values.assign(**{col: values[col].astype(str)}).drop_duplicates()
+        codes = values.groupby(by, sort=False, observed=True).ngroup().to_numpy()
+        strings = values[col].to_numpy()
+        # rows of each group together, in order of appearance or sorted by value
+        order = np.argsort(codes, kind="stable") if ordered else np.lexsort((strings, codes))
+        codes = codes[order]
+        strings = strings[order].tolist()
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        ends = np.append(starts[1:], len(codes))
+        keys = values[by].iloc[order[starts]].set_index(by).index
+        joined[col] = pd.Series([sep.join(strings[i:j]) for i, j in zip(starts, ends)], index=keys, dtype=object).reindex(index)
+
+    result = pd.DataFrame(joined, index=index)
+    return result.where(result.notna(), None)
+
+def value_counts_by_col(df: pd.DataFrame, top: int = None) -> pd.DataFrame: 
+    """ Print the value counts of each column (missing values left out). 
+    See profiling.column_profiler for a summary of large tables or chunked input. 
+
+    Args:
+        top (int): Only print the most frequent values. Optional.
+    """
+    for col in df.columns:
+        counts = df[col].value_counts()
+        if top is not None: 
+            counts = counts.head(top)
         print(f"Value counts for column {col}:")
         print(counts)
         print("\n")
@@ -227,9 +340,7 @@ def generate_md5(file_path):
 
     Returns:
     str: The MD5 checksum of the file.
+    
+    See checksums.checksum_files for several digests over many files.
     """
-    hash_md5 = hashlib.md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
\ No newline at end of file
+    return hash_file(file_path, algorithms=["md5"])["md5"]
\ No newline at end of file
@@ -1,40 +1,134 @@
+import os
+import sys
+from functools import lru_cache
 from glob import glob
 import xml.etree.ElementTree as ET
 
 
-def parse_element(element):
+def _keep_sets(keep):
+    """ Split `keep` into tags, paths (as tuples of tags) and the proper prefixes of those paths """
+    tags, paths, prefixes = set(), set(), set()
+    for k in keep:
+        parts = tuple(p for p in k.strip("/").split("/") if p)
+        if len(parts) == 1:
+            tags.add(parts[0])
+        elif len(parts) > 1:
+            paths.add(parts)
+            prefixes.update(parts[:i] for i in range(1, len(parts)))
+    return tags, paths, prefixes
+
+
+def _add_child(parsed_dict: dict, tag: str, child_dict):
+    """ Repeated tags become a list """
+    if tag in parsed_dict:
+        if not isinstance(parsed_dict[tag], list):
+            parsed_dict[tag] = [parsed_dict[tag]]
+        parsed_dict[tag].append(child_dict)
+    else:
+        parsed_dict[tag] = child_dict
+
+
+def _convert_subtree(element, intern_keys: bool, compact: bool):
     """
-    Recursively parses an XML element and its children into a dictionary.
+    Whole-subtree conversion for parse_element.
+
+    element.iter() visits parents before their children, so each child's dict is created and attached
+    when its parent is visited and filled in when the child itself comes up. Key order matches the
+    recursive version: attributes, children, then text.
+    """
+    intern = sys.intern if intern_keys else None
+
+    if compact and not element.attrib and len(element) == 0:
+        text = element.text.strip() if element.text else ""
+        return text if text else {}
+
+    root_dict = {intern(k): v for k, v in element.attrib.items()} if intern else dict(element.attrib)
+    pending = {element: root_dict}
+    pop = pending.pop
+    for parent in element.iter():
+        parsed_dict = pop(parent, None)
+        if parsed_dict is None: # compact leaf, already stored as its text
+            continue
+        for child in parent:
+            if compact and not child.attrib and len(child) == 0:
+                text = child.text.strip() if child.text else ""
+                child_dict = text if text else {}
+            else:
+                child_dict = {intern(k): v for k, v in child.attrib.items()} if intern else dict(child.attrib)
+                pending[child] = child_dict
+            tag = intern(child.tag) if intern else child.tag
+            existing = parsed_dict.get(tag)
+            if existing is None:
+                parsed_dict[tag] = child_dict
+            elif type(existing) is list:
+                existing.append(child_dict)
+            else:
+                parsed_dict[tag] = [existing, child_dict]
+        text = parent.text
+        if text:
+            text = text.strip()
+            if text:
+                parsed_dict["text"] = text
+    return root_dict
+
+
+def parse_element(element, keep=None, intern_keys: bool = False, compact: bool = False):
+    """
+    Parses an XML element and its children into a dictionary.
+
+    Iterative, so deep documents do not hit the recursion limit.
 
     Args:
         element (xml.etree.ElementTree.Element): The XML element to parse.
+        keep (set): Optional tags (e.g. 'Keyword') or paths relative to `element` (e.g. 'Keywords/Keyword')
+            to convert. Other subtrees are skipped without building dicts for them, and ancestors of kept
+            elements only hold their kept children.
+        intern_keys (bool): Intern tags and attribute names so repeated keys share one string.
+        compact (bool): Elements with only text become the text instead of {'text': ...}.
 
     Returns:
         dict: A dictionary representation of the XML element, including its attributes,
               children, and text content.
     """
-    parsed_dict = {}
-    if element.attrib:
-        parsed_dict.update(element.attrib)
-    for child in element:
-        child_dict = parse_element(child)
-        if child.tag in parsed_dict:
-            if not isinstance(parsed_dict[child.tag], list):
-                parsed_dict[child.tag] = [parsed_dict[child.tag]]
-            parsed_dict[child.tag].append(child_dict)
-        else:
-            parsed_dict[child.tag] = child_dict
-    if element.text and element.text.strip():
-        parsed_dict["text"] = element.text.strip()
-    return parsed_dict
+    if keep is None:
+        return _convert_subtree(element, intern_keys, compact)
+
+    keep_tags, keep_paths, prefixes = _keep_sets(keep)
+    if element.tag in keep_tags:
+        return _convert_subtree(element, intern_keys, compact)
+
+    # walk the skipped part of the tree with an explicit stack: element, child iterator, dict of kept children, path
+    stack = [[element, iter(element), None, ()]]
+    while True:
+        frame = stack[-1]
+        child = next(frame[1], None)
+        if child is not None:
+            path = frame[3] + (child.tag,)
+            if child.tag in keep_tags or path in keep_paths:
+                if frame[2] is None:
+                    frame[2] = {}
+                _add_child(frame[2], sys.intern(child.tag) if intern_keys else child.tag, _convert_subtree(child, intern_keys, compact))
+            elif len(keep_tags) > 0 or path in prefixes:
+                stack.append([child, iter(child), None, path])
+            continue
+
+        elem, _, parsed_dict, _ = stack.pop()
+        if not stack:
+            return parsed_dict if parsed_dict is not None else {}
+        if parsed_dict is not None:
+            parent = stack[-1]
+            if parent[2] is None:
+                parent[2] = {}
+            _add_child(parent[2], sys.intern(elem.tag) if intern_keys else elem.tag, parsed_dict)
 
 
-def parse_xml(xml_text: str) -> dict:
+def parse_xml(xml_text: str, **kwargs) -> dict:
     """
     Parses an XML string into a dictionary.
 
     Args:
         xml_text (str): The XML string to parse.
+        **kwargs: Passed to parse_element (keep, intern_keys, compact).
 
     Returns:
         dict: A dictionary representation of the XML string, or None if parsing fails.
@@ -42,21 +136,177 @@ def parse_xml(xml_text: str) -> dict:
     # xml_text = "<Root>" + xml_text + "</Root>"
     try:
         root = ET.fromstring(xml_text)
-        parsed_dict = {root.tag: parse_element(root)}
+        parsed_dict = {root.tag: parse_element(root, **kwargs)}
         return parsed_dict
     except Exception as e:
         print(e)
         return None
 
+def _iter_chunks(source, chunk_size: int):
+    """ Byte chunks from a path, a binary file object or an iterable of chunks """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    elif hasattr(source, "read"):
+        while chunk := source.read(chunk_size):
+            yield chunk
+    else:
+        yield from source
+
+
+def iter_xml_records(source, record_path: str, chunk_size: int = 1024 * 1024, **kwargs):
+    """
+    Streams an XML document and yields one dictionary per record, without holding the whole document in memory.
+
+    Elements are removed from the tree once they are read, so memory stays proportional to one record
+    rather than to the document.
+
+    Example:
+        for sample in iter_xml_records("workspace.wsp", "Workspace/SampleList/Sample"):
+            ...
+        response = requests.get(url, stream=True)
+        records = iter_xml_records(response.iter_content(1024 * 1024), "Root/Record")
+
+    Args:
+        source (str, file object or iterable): Path to the XML file, a binary file object, or an iterable of
+            byte chunks (e.g. a streamed HTTP body).
+        record_path (str): Path of the record elements from the root, including the root tag.
+        chunk_size (int): Bytes per read for paths and file objects.
+        **kwargs: Passed to parse_element (keep, intern_keys, compact).
+
+    Yields:
+        dict: parse_element of each record, in document order.
+    """
+    record = tuple(p for p in record_path.strip("/").split("/") if p)
+    parser = ET.XMLPullParser(events=("start", "end"))
+    tags = []
+    elements = []
+    for chunk in _iter_chunks(source, chunk_size):
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == "start":
+                tags.append(elem.tag)
+                elements.append(elem)
+                continue
+
+            in_record = len(tags) > len(record) and tuple(tags[:len(record)]) == record
+            if tuple(tags) == record:
+                yield parse_element(elem, **kwargs)
+            tags.pop()
+            elements.pop()
+            # keep the record subtree until the record itself is done, drop everything else as soon as it ends
+            if not in_record and elements:
+                elem.clear()
+                elements[-1].remove(elem)
+    parser.close()
+
+
 def print_elements(element, level=0):
     indent = "  " * level
     print(f"{indent}{element.tag}: {element.attrib}")
     for child in element:
         print_elements(child, level + 1)
 
+@lru_cache(maxsize=256)
+def compile_query(query: str) -> tuple:
+    """
+    Compiles a find_paths query.
+
+    'Tag' matches the tag anywhere, 'Parent/Tag' matches the end of the path, '*' matches any one tag and
+    a leading '/' anchors the query at the element the search starts from.
+
+    Returns:
+        tuple: (anchored, tags) with the tags interned.
+    """
+    anchored = query.startswith("/")
+    tags = tuple(sys.intern(t) for t in query.strip("/").split("/") if t)
+    if len(tags) == 0:
+        raise ValueError(f"Empty query: {query!r}")
+    return anchored, tags
+
+
+@lru_cache(maxsize=64)
+def _compile_queries(queries: tuple) -> dict:
+    """ Compiled queries bucketed by their last tag, so each element is only checked against queries that can match it """
+    buckets = {}
+    for query in queries:
+        anchored, tags = compile_query(query)
+        simple = len(tags) == 1 and not anchored # plain tag, matches on the tag alone
+        buckets.setdefault(tags[-1], []).append((query, simple, anchored, tags))
+    if "*" in buckets:
+        buckets = {t: qs + buckets["*"] if t != "*" else qs for t, qs in buckets.items()}
+    return buckets
+
+
+def _path_matches(path: list, anchored: bool, tags: tuple) -> bool:
+    n = len(tags)
+    if len(path) < n or (anchored and len(path) != n):
+        return False
+    for tag, part in zip(tags, path[len(path) - n:]):
+        if tag != "*" and tag != part:
+            return False
+    return True
+
+
+def find_paths(element, queries, join: bool = False) -> dict:
+    """
+    Finds the elements matching several tags or path queries in one walk of the tree.
+
+    Example:
+        hits = find_paths(root, ["ChannelDescription", "Channels/ChannelDescription", "/LMSDataContainerHeader/Element"])
+
+    Args:
+        element (xml.etree.ElementTree.Element): The XML element to search within.
+        queries (list): Tags or path queries, see compile_query.
+        join (bool): Return paths as '/A/B' strings instead of tuples of tags.
+
+    Returns:
+        dict: For each query, a list of (path, element) tuples in document order. Paths start at `element`.
+    """
+    if isinstance(queries, str):
+        queries = [queries]
+    queries = tuple(dict.fromkeys(queries))
+    buckets = _compile_queries(queries)
+    any_tag = buckets.get("*", ())
+    found = {q: [] for q in queries}
+
+    # depth-first with a stack of child iterators. `path` holds the tags down to the current element and is
+    # copied into a tuple for hits only; with join, `joined` holds the matching '/A/B' strings
+    intern = sys.intern
+    path = []
+    joined = [""]
+    stack = [iter((element,))]
+    while stack:
+        elem = next(stack[-1], None)
+        if elem is None:
+            stack.pop()
+            if stack:
+                path.pop()
+                if join:
+                    joined.pop()
+            continue
+
+        tag = intern(elem.tag)
+        path.append(tag)
+        if join:
+            joined.append(f"{joined[-1]}/{tag}")
+        for query, simple, anchored, tags in buckets.get(tag, any_tag):
+            if simple or _path_matches(path, anchored, tags):
+                found[query].append((joined[-1] if join else tuple(path), elem))
+        if len(elem):
+            stack.append(iter(elem))
+        else:
+            path.pop()
+            if join:
+                joined.pop()
+
+    return found
+
+
 def recursive_find_with_path(element, tag, path=""):
     """
-    Recursively searches for all occurrences of a specific tag in an XML element and its children,
+    Searches for all occurrences of a specific tag in an XML element and its children,
     and returns the path to each found element.
 
     Args:
@@ -67,14 +317,8 @@ def recursive_find_with_path(element, tag, path=""):
     Returns:
         list: A list of tuples, each containing the path and the found element.
     """
-    
-    found_elements = []
-    current_path = f"{path}/{element.tag}"
-    if element.tag == tag:
-        found_elements.append((current_path, element))
-    for child in element:
-        found_elements.extend(recursive_find_with_path(child, tag, current_path))
-    return found_elements
+    hits = find_paths(element, [tag], join=True)[tag]
+    return [(path + p, e) for p, e in hits] if path else hits
 
 def recursive_search_for_tag_with_attribute(element, tag, attribute, value):
     """_summary_
@@ -100,3 +344,58 @@ def recursive_search_for_tag_with_attribute(element, tag, attribute, value):
         if result is not None:
             return result
     return None
+
+
+class XmlIndex:
+    """
+    Parses an XML document once and indexes it for repeated lookups.
+
+    Builds lookup tables for tag -> elements, (tag, attribute, value) -> element and element -> path in one walk,
+    so queries do not re-parse the document or search the tree.
+
+    Example:
+        index = XmlIndex(lif.xml_header)
+        hardware = index.find_with_attribute('Attachment', 'Name', 'HardwareSetting')
+    """
+
+    def __init__(self, xml):
+        """
+        Args:
+            xml (str or xml.etree.ElementTree.Element): The XML string or an already parsed element.
+        """
+        if isinstance(xml, str):
+            xml = ET.fromstring(xml)
+        self.root = xml
+        self._by_tag = {}
+        self._by_attribute = {}
+        self._paths = {}
+
+        # pre-order, so the first element stored for a key matches what a recursive search finds
+        stack = [(xml, ())]
+        while stack:
+            element, parent_path = stack.pop()
+            path = parent_path + (element.tag,)
+            self._paths[element] = path
+            self._by_tag.setdefault(element.tag, []).append(element)
+            for attribute, value in element.attrib.items():
+                self._by_attribute.setdefault((element.tag, attribute, value), element)
+            stack.extend((child, path) for child in reversed(element))
+
+    def find_all(self, tag: str) -> list:
+        """ All elements with the tag, in document order """
+        return self._by_tag.get(tag, [])
+
+    def find_with_attribute(self, tag: str, attribute: str, value: str):
+        """ First element with the tag and attribute value, or None. Same result as recursive_search_for_tag_with_attribute """
+        return self._by_attribute.get((tag, attribute, value))
+
+    def path(self, element) -> str:
+        """ Path from the root to the element, e.g. '/Root/Element/Data' """
+        return "/" + "/".join(self._paths[element])
+
+    def find_all_with_path(self, tag: str) -> list:
+        """
+        Returns:
+            list: (path, element) tuples for every element with the tag, like recursive_find_with_path on the root.
+        """
+        return [(self.path(e), e) for e in self.find_all(tag)]
@@ -0,0 +1,214 @@
+""" Zip archives for data submissions, compressing members in parallel and storing precompressed data as is """
+
+from __future__ import annotations
+import os
+import sys
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from datatools.utils.checksums import CHUNK_SIZE, multi_digest
+from datatools.utils.lazy import lazy_import
+
+pd = lazy_import("pandas")
+tqdm = lazy_import("tqdm")
+
+# image and archive formats that are already compressed, or do not get smaller with deflate
+stored_extensions = {
+    ".tif", ".tiff", ".lif", ".ims", ".czi", ".nd2", ".fcs",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z",
+    ".jpg", ".jpeg", ".png", ".gif", ".mp4", ".avi", ".parquet",
+}
+
+SAMPLE_BYTES = 256 * 1024
+MAX_BUFFERED = 64 * 1024 * 1024 # file data held in memory at once, larger files are streamed by the writing thread
+
+# _write_compressed uses ZipFile internals that are the same from CPython 3.8 to 3.14. On other versions and
+# implementations every member is streamed through ZipFile.open instead, without the parallel compression
+RAW_WRITES = (
+    sys.implementation.name == "cpython"
+    and (3, 8) <= sys.version_info[:2] <= (3, 14)
+    and hasattr(zipfile.ZipFile, "_writecheck")
+    and hasattr(zipfile.ZipInfo, "FileHeader")
+)
+
+
+def choose_compression(file_path, sample_bytes: int = SAMPLE_BYTES, min_saving: float = 0.1) -> int:
+    """
+    ZIP_STORED or ZIP_DEFLATED for a file.
+
+    Stored by extension (`stored_extensions`), otherwise deflated if a sample from the start of the file
+    shrinks by at least `min_saving` at the fastest zlib level.
+
+    Args:
+        file_path (str): Path to the file.
+        sample_bytes (int): Bytes to test.
+        min_saving (float): Fraction the sample has to shrink by to be deflated.
+
+    Returns:
+        int: zipfile.ZIP_STORED or zipfile.ZIP_DEFLATED.
+    """
+    if Path(file_path).suffix.lower() in stored_extensions:
+        return zipfile.ZIP_STORED
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_bytes)
+    if len(sample) == 0:
+        return zipfile.ZIP_STORED
+    saving = 1 - len(zlib.compress(sample, 1)) / len(sample)
+    return zipfile.ZIP_DEFLATED if saving >= min_saving else zipfile.ZIP_STORED
+
+
+def _read_member(file_path, compress_type: int, level: int, algorithms) -> tuple:
+    """ Reads one file in a worker: CRC, optional digests and the (raw deflate) compressed data """
+    crc = 0
+    size = 0
+    digest = multi_digest(algorithms) if algorithms else None
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if compress_type == zipfile.ZIP_DEFLATED else None
+    parts = []
+    with open(file_path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            if digest is not None:
+                digest.update(chunk)
+            parts.append(compressor.compress(chunk) if compressor is not None else chunk)
+    if compressor is not None:
+        parts.append(compressor.flush())
+    return crc, size, b"".join(parts), digest.hexdigests() if digest is not None else {}
+
+
+def _write_compressed(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, crc: int, size: int, data: bytes):
+    """
+    Append a member whose data is already compressed. zipfile has no public API for this, so it does what
+    ZipFile.write does for the local header and bookkeeping, and close() writes the central directory.
+    Only used when RAW_WRITES is true.
+    """
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = len(data)
+    zip64 = zinfo.file_size > zipfile.ZIP64_LIMIT or zinfo.compress_size > zipfile.ZIP64_LIMIT
+    with zf._lock:
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zinfo.header_offset = zf.fp.tell()
+        zf.fp.write(zinfo.FileHeader(zip64))
+        zf.fp.write(data)
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+        zf.start_dir = zf.fp.tell()
+
+
+def _stream_member(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, file_path, algorithms) -> dict:
+    """ Copy a large file into the archive in chunks, hashing the same reads """
+    digest = multi_digest(algorithms) if algorithms else None
+    with open(file_path, "rb") as src, zf.open(zinfo, "w", force_zip64=True) as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            if digest is not None:
+                digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigests() if digest is not None else {}
+
+
+def build_zip(file_paths: list, output_zip, workers: int = None, level: int = 6, compression: str = "auto",
+              arcnames: list = None, manifest_path=None, algorithms=("md5",), window: int = None,
+              max_buffered: int = MAX_BUFFERED, progress: bool = True) -> pd.DataFrame:
+    """
+    Write a zip archive, deflating compressible files on worker threads and storing the rest.
+
+    Files are read, checksummed and compressed by the workers and written to the archive in the given order.
+    At most `window` files and `max_buffered` bytes of file data are in flight at once; files larger than
+    `max_buffered` are streamed into the archive. ZIP64 is used where needed, so members and archives can be
+    larger than 4 GiB. Without RAW_WRITES every file is streamed, compressed at zlib's default level.
+
+    Args:
+        file_paths (list): Files to add. Missing files are skipped with a message.
+        output_zip (str): Path of the archive.
+        workers (int): Compression threads. Defaults to the number of CPUs.
+        level (int): zlib level for deflated members.
+        compression (str): 'auto' (choose_compression per file), 'store' or 'deflate'.
+        arcnames (list): Names in the archive. Defaults to the file names.
+        manifest_path (str): Write a csv of the members and their checksums here. Optional.
+        algorithms (list): hashlib algorithms for the manifest, computed from the same reads.
+        window (int): Files compressed ahead of the writer. Defaults to 2 * workers.
+        max_buffered (int): Bytes of file data held in memory by the workers and the writer together.
+        progress (bool): Show a progress bar.
+
+    Returns:
+        pd.DataFrame: One row per member: name, path, size, compress_size, compress_type and the checksums.
+    """
+    if compression not in ("auto", "store", "deflate"):
+        raise ValueError("compression must be 'auto', 'store' or 'deflate'")
+    workers = workers or os.cpu_count() or 1
+    window = window or 2 * workers
+    algorithms = list(algorithms) if manifest_path is not None else []
+    if arcnames is None:
+        arcnames = [os.path.basename(f) for f in file_paths]
+
+    members = []
+    for file_path, arcname in zip(file_paths, arcnames):
+        if not os.path.isfile(file_path):
+            print(f"File not found: {file_path}")
+            continue
+        if compression == "auto":
+            compress_type = choose_compression(file_path)
+        else:
+            compress_type = zipfile.ZIP_STORED if compression == "store" else zipfile.ZIP_DEFLATED
+        zinfo = zipfile.ZipInfo.from_file(file_path, arcname)
+        zinfo.compress_type = compress_type
+        members.append((file_path, zinfo))
+
+    total_bytes = sum(z.file_size for _, z in members)
+    rows = []
+    start = time.perf_counter()
+    with zipfile.ZipFile(output_zip, "w", allowZip64=True) as zf, \
+            ThreadPoolExecutor(max_workers=workers) as executor, \
+            tqdm.tqdm(total=total_bytes, unit="B", unit_scale=True, desc="Zipping files...", disable=not progress) as bar:
+
+        raw_writes = RAW_WRITES and all(hasattr(zf, a) for a in ("_lock", "_didModify", "start_dir"))
+        if not raw_writes:
+            print("Writing members one at a time, parallel compression needs CPython 3.8 to 3.14")
+        pending = deque() # futures, or None for members streamed by the writer
+        next_index = 0
+        buffered = 0 # bytes of the submitted members not yet written
+        for i, (file_path, zinfo) in enumerate(members):
+            while next_index < len(members) and len(pending) < window:
+                next_path, next_zinfo = members[next_index]
+                if not raw_writes or next_zinfo.file_size > max_buffered:
+                    pending.append(None)
+                elif buffered + next_zinfo.file_size <= max_buffered:
+                    buffered += next_zinfo.file_size
+                    pending.append(executor.submit(_read_member, next_path, next_zinfo.compress_type, level, algorithms))
+                else:
+                    break # wait for the writer to free some of the budget
+                next_index += 1
+            future = pending.popleft()
+            if future is None:
+                digests = _stream_member(zf, zinfo, file_path, algorithms)
+            else:
+                crc, size, data, digests = future.result()
+                _write_compressed(zf, zinfo, crc, size, data)
+                buffered -= zinfo.file_size
+                del data, future
+            bar.update(zinfo.file_size)
+            rows.append({
+                "name": zinfo.filename,
+                "path": str(file_path),
+                "size": zinfo.file_size,
+                "compress_size": zinfo.compress_size,
+                "compress_type": "deflate" if zinfo.compress_type == zipfile.ZIP_DEFLATED else "store",
+            } | digests)
+
+    seconds = time.perf_counter() - start
+    archive_size = os.path.getsize(output_zip)
+    print(
+        f"Zipped {len(rows)} files, {total_bytes / 1024**2:.1f} MiB -> {archive_size / 1024**2:.1f} MiB "
+        f"in {seconds:.1f}s ({total_bytes / 1024**2 / max(seconds, 1e-9):.1f} MiB/s)"
+    )
+
+    members_df = pd.DataFrame(rows, columns=["name", "path", "size", "compress_size", "compress_type"] + algorithms)
+    if manifest_path is not None:
+        members_df.to_csv(manifest_path, index=False)
+        print(f"Wrote manifest: {manifest_path}")
+    return members_df
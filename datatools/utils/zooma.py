@@ -1,11 +1,16 @@
 """ For ontology lookups using the Zooma API. """
-import requests
+from __future__ import annotations
 import json
 from urllib.parse import urlparse
 from datatools.utils.utils import apply_to_list
+from datatools.utils.metrics import timed_http
+from datatools.utils.cache import ttl_cache
 from dataclasses import dataclass
 from typing import List, Dict, Any, Optional, Tuple
-import pandas as pd
+from datatools.utils.lazy import lazy_import
+
+requests = lazy_import("requests")
+pd = lazy_import("pandas")
 
 @apply_to_list
 def parse_ontology_term(url: str) -> Tuple[str, str]:
@@ -23,9 +28,22 @@ def parse_ontology_term(url: str) -> Tuple[str, str]:
 
 @dataclass
 class zooma:
-    def __init__(self, ssl_pem_file_path):
+    def __init__(self, ssl_pem_file_path, cache=None, ttl: float = 30 * 24 * 3600, max_entries: int = 100_000):
+        """
+        Args:
+            ssl_pem_file_path (str): CA bundle for the EBI certificate.
+            cache (str or ttl_cache): SQLite file (or an open ttl_cache) for annotation lookups. Without it every
+                lookup calls the API.
+            ttl (float): Seconds a cached lookup stays valid, when `cache` is a path.
+            max_entries (int): Cached terms kept, least recently used are evicted first, when `cache` is a path.
+        """
         self.BASE_URL = "https://www.ebi.ac.uk/spot/zooma/v2/api"
         self.ssl_pem_file_path = ssl_pem_file_path
+        # one connection pool for every lookup, so repeated calls skip the TCP and TLS handshakes
+        self.session = requests.Session()
+        if cache is not None and not isinstance(cache, ttl_cache):
+            cache = ttl_cache(cache, namespace="zooma/annotate", ttl=ttl, max_entries=max_entries)
+        self.cache = cache
 
     def is_valid_url(url):
         try:
@@ -39,17 +57,20 @@ class zooma:
 
     def handle_request(self, method, endpoint, params=None):
         url = self.join_url(self.BASE_URL, endpoint)
+        response = None
         try:
-            if method == "GET":
-                response = requests.get(
-                    url, params=params, verify=self.ssl_pem_file_path
-                )
-            elif method == "POST":
-                response = requests.post(
-                    url, json=params, verify=self.ssl_pem_file_path
-                )
-            else:
-                raise ValueError("Unsupported HTTP method")
+            with timed_http(f"zooma/{str(endpoint).strip('/')}", method) as call:
+                if method == "GET":
+                    response = self.session.get(
+                        url, params=params, verify=self.ssl_pem_file_path
+                    )
+                elif method == "POST":
+                    response = self.session.post(
+                        url, json=params, verify=self.ssl_pem_file_path
+                    )
+                else:
+                    raise ValueError("Unsupported HTTP method")
+                call.record_response(response)
 
             response.raise_for_status()
             return response
@@ -66,6 +87,8 @@ class zooma:
         
         data = json.loads(response.text)
         print("Number of results: ", len(data))
+        if len(data) == 0:
+            return pd.DataFrame()
         print("Results: ")
         combined_dict = [
             {
@@ -93,14 +116,23 @@ class zooma:
         print("Term: ", term)
         term = term.replace(" ", "+").lower()
 
+        if self.cache is not None:
+            cached = self.cache.get(term)
+            if cached is not None:
+                results = pd.DataFrame(**cached["results"])
+                print("Number of results (cached): ", len(results))
+                return json.loads(cached["raw"]), results
+
         params = {"propertyValue": term}
 
         response = self.handle_request("GET", endpoint, params)
 
 
-        if response.status_code == 200:
+        if response is not None and response.status_code == 200:
             data = json.loads(response.text)
             results = self.response_to_df(response)
+            if self.cache is not None:
+                self.cache.put(term, {"raw": response.text, "results": results.to_dict(orient="split")})
 
             return data, results
         else:
@@ -0,0 +1,41 @@
+""" The machine a benchmark ran on, so timings are only judged against a baseline from the same kind of host """
+
+import os
+import platform
+
+
+def cpu_model() -> str:
+    """ CPU model name, from /proc/cpuinfo on Linux """
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def host_info() -> dict:
+    """ Hardware and interpreter the timings depend on """
+    return {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpu": cpu_model(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+    }
+
+
+def host_differences(baseline_host: dict) -> list:
+    """
+    Fields where this host differs from the baseline's. A baseline without host info differs in everything.
+
+    Returns:
+        list: 'field: baseline -> current' strings, empty for the same host.
+    """
+    if not baseline_host:
+        return ["baseline has no host info"]
+    current = host_info()
+    return [f"{k}: {baseline_host.get(k)} -> {v}" for k, v in current.items() if baseline_host.get(k) != v]
@@ -0,0 +1,119 @@
+""" Import-time benchmark for the datatools modules
+
+Every module is imported in a fresh interpreter, so nothing is cached between cases. Also reports heavy
+dependencies (pandas, h5py, ...) that were loaded by the import itself instead of on first use.
+
+Run from the repository root so `datatools` is importable.
+
+Usage:
+    python -m dev.bench_import
+    python -m dev.bench_import --save-baseline dev/bench_import_baseline.json
+    python -m dev.bench_import --baseline dev/bench_import_baseline.json
+
+Slowdowns only count as regressions against a baseline recorded on the same kind of host, see dev.bench_host.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+from dev.bench_host import host_differences, host_info
+
+modules = [
+    "datatools",
+    "datatools.utils.utils",
+    "datatools.utils.uncat",
+    "datatools.utils.zooma",
+    "datatools.utils.profiling",
+    "datatools.utils.cleaning",
+    "datatools.file_processing.microscopy",
+    "datatools.file_processing.flow",
+    "datatools.helpers.geo",
+    "datatools.repositories.redcap",
+    "datatools.repositories.immport",
+    "datatools.repositories.pubmed",
+]
+
+heavy = ["pandas", "numpy", "pyarrow", "requests", "h5py", "readlif.reader", "bs4", "Bio.Entrez", "dotenv", "tqdm"]
+
+# lazy_import leaves a placeholder in sys.modules until first use, so only count modules that actually ran
+script = """
+import json, sys, time, types
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+loaded = [m for m in {heavy!r} if type(sys.modules.get(m)) is types.ModuleType]
+print(json.dumps({{"seconds": seconds, "loaded": loaded}}))
+"""
+
+
+def measure(module: str, repeats: int) -> dict:
+    """ Best of `repeats` imports, each in a new interpreter """
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", script.format(module=module, heavy=heavy)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        runs.append(json.loads(output))
+    best = min(runs, key=lambda r: r["seconds"])
+    return {"seconds": best["seconds"], "loaded": best["loaded"]}
+
+
+def compare(results: dict, baseline: dict, threshold: float, same_host: bool = True) -> bool:
+    """
+    Print the change against the baseline. Returns False if any import is slower than `threshold` times the baseline,
+    which is only checked when the baseline was recorded on the same host.
+    """
+    ok = True
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<40} no baseline")
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        flag = ""
+        if ratio > threshold and same_host:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<40} time x{ratio:.2f}{flag}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=modules, help="modules to import")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.5, help="slowdown ratio counted as a regression")
+    parser.add_argument("--strict", action="store_true", help="fail if an import loads a heavy dependency")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module in args.modules:
+        results[module] = result = measure(module, args.repeats)
+        loaded = f"  loads {', '.join(result['loaded'])}" if result["loaded"] else ""
+        print(f"{module:<40} {result['seconds'] * 1000:10.2f} ms{loaded}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"host": host_info(), "results": results}, f, indent=2)
+        print(f"Wrote baseline: {args.save_baseline}")
+
+    status = 0
+    if args.strict and any(r["loaded"] for r in results.values()):
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differences = host_differences(baseline.get("host"))
+        if differences:
+            print(f"Baseline was recorded on another host, not checking for regressions ({'; '.join(differences)})")
+        if not compare(results, baseline["results"], args.threshold, same_host=not differences):
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
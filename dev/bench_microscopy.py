@@ -0,0 +1,190 @@
+""" Benchmarks for microscopy metadata extraction on synthetic LIF and IMS files
+
+Run from the repository root so `datatools` is importable.
+
+Usage:
+    python -m dev.bench_microscopy --series 200 --channels 4 --depth 10
+    python -m dev.bench_microscopy --save-baseline dev/bench_baseline.json
+    python -m dev.bench_microscopy --baseline dev/bench_baseline.json
+
+Baselines record the host and scale they ran at. Slowdowns only count as regressions against a baseline from the
+same kind of host (CPU, core count, Python) at the same scale; against any other baseline the ratios are printed
+for information.
+"""
+
+import argparse
+import json
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from datatools.file_processing import microscopy
+from datatools.utils import xml_helpers
+from dev.bench_host import host_differences, host_info
+
+
+def synthetic_lif_header(file_name: str, n_series: int, n_channels: int, depth: int) -> str:
+    """
+    LIF-style XML header with `n_series` images of `n_channels` channels each.
+    Every image also gets a chain of `depth` nested elements to make the tree deeper.
+    """
+    series = []
+    for s in range(n_series):
+        channels = "".join(
+            f'<ChannelDescription DataType="0" ChannelTag="0" Resolution="8" BytesInc="{c * 16}" LUTName="Gray">'
+            f'<ChannelProperty><Key>DyeName</Key><Value>Dye{c}</Value></ChannelProperty>'
+            f'<ChannelProperty><Key>Emission</Key><Value>{500 + 10 * c}</Value></ChannelProperty>'
+            f'</ChannelDescription>'
+            for c in range(n_channels)
+        )
+        nested = "".join(f'<Level Depth="{d}">' for d in range(depth)) + "</Level>" * depth
+        series.append(
+            f'<Element Name="Series{s:04d}"><Data><Image><ImageDescription><Channels>{channels}</Channels>'
+            '<Dimensions><DimensionDescription DimID="1" NumberOfElements="4" Length="1e-6" BytesInc="1"/>'
+            '<DimensionDescription DimID="2" NumberOfElements="4" Length="1e-6" BytesInc="4"/></Dimensions>'
+            '</ImageDescription>'
+            '<Attachment Name="HardwareSetting" Version="1">'
+            '<ATLConfocalSettingDefinition MicroscopeModel="DMi8" Magnification="63" ObjectiveName="HC PL APO"/>'
+            f'</Attachment><Attachment Name="Filler">{nested}</Attachment></Image></Data>'
+            f'<Memory Size="0" MemoryBlockID="MemBlock_{s}"/><Children/></Element>'
+        )
+    return (
+        f'<LMSDataContainerHeader Version="2"><Element Name="{file_name}"><Data><Experiment/></Data>'
+        f'<Memory Size="0" MemoryBlockID="MemBlock_top"/><Children>{"".join(series)}</Children></Element>'
+        '</LMSDataContainerHeader>'
+    )
+
+
+def write_lif(file_path, n_series: int, n_channels: int, depth: int):
+    """ Header-only .lif file: magic bytes, memory byte, header length and the UTF-16 header """
+    xml = synthetic_lif_header(Path(file_path).name, n_series, n_channels, depth)
+    data = xml.encode("utf-16-le")
+    with open(file_path, "wb") as f:
+        f.write(microscopy.LIF_MAGIC)
+        f.write(struct.pack("<I", len(data) + 5))
+        f.write(b"\x2a")
+        f.write(struct.pack("<I", len(xml)))
+        f.write(data)
+
+
+def write_ims(file_path, n_channels: int):
+    """ Small .ims (HDF5) file with the DataSetInfo attributes Imaris writes, stored as character arrays """
+    def attribute(value):
+        return np.array(list(str(value)), dtype="|S1")
+
+    image = {k: "1" for k in microscopy.ims_keys} | {"X": 64, "Y": 64, "Z": 4}
+    with h5py.File(file_path, "w") as f:
+        group = f.create_group("DataSetInfo/Image")
+        for k, v in image.items():
+            group.attrs[k] = attribute(v)
+        for c in range(n_channels):
+            f.create_group(f"DataSetInfo/Channel {c}").attrs["Name"] = attribute(f"Dye{c}")
+            f.create_dataset(
+                f"DataSet/ResolutionLevel 0/TimePoint 0/Channel {c}/Data", data=np.zeros((4, 64, 64), dtype=np.uint8)
+            )
+
+
+def measure(func, repeats: int) -> dict:
+    """ Best wall time over `repeats` runs and peak traced memory of one more run """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak}
+
+
+def run_benchmarks(n_series: int, n_channels: int, depth: int, repeats: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        lif_path = Path(tmp) / "synthetic.lif"
+        ims_path = Path(tmp) / "synthetic.ims"
+        write_lif(lif_path, n_series, n_channels, depth)
+        write_ims(ims_path, n_channels)
+
+        processor = microscopy.lif_file_processor(str(lif_path), metadata_only=True)
+        root = ET.fromstring(processor.lif.xml_header)
+
+        def overall_md():
+            processor.__dict__.pop("xml_index", None) # time the index build as well
+            processor.get_overall_md()
+
+        cases = {
+            "get_overall_md": overall_md,
+            "get_channels": lambda: microscopy.get_channels(processor.lif),
+            "recursive_find_with_path": lambda: xml_helpers.recursive_find_with_path(root, "ChannelProperty"),
+            "find_paths": lambda: xml_helpers.find_paths(root, ["ChannelProperty", "ChannelDescription", "Attachment", "Memory"]),
+            "parse_element": lambda: xml_helpers.parse_element(root),
+            "ims_metadata_extract": lambda: microscopy.ims_metadata_extract(str(ims_path)),
+        }
+        return {name: measure(func, repeats) for name, func in cases.items()}
+
+
+def compare(results: dict, baseline: dict, threshold: float, comparable: bool = True) -> bool:
+    """
+    Print the change against the baseline. Returns False if any case is slower than `threshold` times the baseline,
+    which is only checked when the baseline was recorded on the same host at the same scale.
+    """
+    ok = True
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<28} no baseline")
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        memory_ratio = result["peak_bytes"] / max(baseline[name]["peak_bytes"], 1)
+        flag = ""
+        if ratio > threshold and comparable:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<28} time x{ratio:.2f}  memory x{memory_ratio:.2f}{flag}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, default=100, help="images per LIF header")
+    parser.add_argument("--channels", type=int, default=4, help="channels per image")
+    parser.add_argument("--depth", type=int, default=5, help="extra nesting depth per image")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args(argv)
+
+    scale = f"series={args.series} channels={args.channels} depth={args.depth}"
+    print(f"Scale: {scale}")
+    results = run_benchmarks(args.series, args.channels, args.depth, args.repeats)
+    for name, result in results.items():
+        print(f"{name:<28} {result['seconds'] * 1000:10.2f} ms  {result['peak_bytes'] / 1024**2:8.2f} MiB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"scale": scale, "host": host_info(), "results": results}, f, indent=2)
+        print(f"Wrote baseline: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        differences = host_differences(baseline.get("host"))
+        if baseline["scale"] != scale:
+            differences.append(f"scale: {baseline['scale']} -> {scale}")
+        if differences:
+            print(f"Baseline was recorded on another host or scale, not checking for regressions ({'; '.join(differences)})")
+        if not compare(results, baseline["results"], args.threshold, comparable=not differences):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,9 @@ setup(
         packages=find_packages(),
         install_requires=["python-dotenv"], # add any additional packages that 
         # needs to be installed along with your package. Eg: 'caer'
+        entry_points={
+            'console_scripts': ['datatools=datatools.cli:main'],
+        },
 
         keywords=['python', 'data processing'],
         
@@ -0,0 +1,101 @@
+import csv
+import hashlib
+
+import pandas as pd
+import pytest
+
+from datatools.utils import checksums
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"file_{i}.txt"
+        path.write_text(f"contents {i}\n" * (i + 1))
+        paths.append(str(path))
+    return paths
+
+
+original_hash_entry = checksums._hash_entry
+
+
+class Interrupted(Exception):
+    """ Stands in for the run being stopped """
+
+
+def read_rows(manifest_path):
+    with open(manifest_path, newline="") as f:
+        reader = csv.reader(f)
+        return next(reader), list(reader)
+
+
+def test_checksum_files_other_algorithms_rewrite_the_header(tmp_path, files, monkeypatch):
+    manifest_path = tmp_path / "manifest.csv"
+    checksums.checksum_files(files[:2], manifest_path, algorithms=["md5"], workers=1, progress=False)
+
+    counting_hash_entry(monkeypatch, fail_on=files[3])
+    with pytest.raises(Interrupted):
+        checksums.checksum_files(files, manifest_path, algorithms=["md5", "sha1"], workers=1, progress=False)
+
+    # the run stopped before the final rewrite, and the appended rows still line up with the header
+    header, rows = read_rows(manifest_path)
+    assert header == ["path", "size", "mtime", "md5", "sha1"]
+    assert all(len(row) == len(header) for row in rows)
+    for row in checksums.read_manifest(manifest_path).values():
+        if row["sha1"]:
+            assert row["sha1"] == hashlib.sha1(open(row["path"], "rb").read()).hexdigest()
+
+
+def test_hash_file_matches_hashlib(files):
+    data = open(files[3], "rb").read()
+    digests = checksums.hash_file(files[3], ["md5", "sha256"], chunk_size=7)
+    assert digests == {"md5": hashlib.md5(data).hexdigest(), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def counting_hash_entry(monkeypatch, fail_on=None):
+    """ Records the files hashed, and raises Interrupted on `fail_on` """
+    hashed = []
+
+    def wrapper(file_path, *args):
+        if file_path == fail_on:
+            raise Interrupted
+        hashed.append(file_path)
+        return original_hash_entry(file_path, *args)
+
+    monkeypatch.setattr(checksums, "_hash_entry", wrapper)
+    return hashed
+
+
+def test_checksum_files_skips_unchanged_files(tmp_path, files, monkeypatch):
+    manifest_path = tmp_path / "manifest.csv"
+    first = checksums.checksum_files(files, manifest_path, workers=2, progress=False)
+    assert first["md5"].tolist() == [hashlib.md5(open(f, "rb").read()).hexdigest() for f in files]
+
+    hashed = counting_hash_entry(monkeypatch)
+    second = checksums.checksum_files(files, manifest_path, workers=2, progress=False)
+    assert hashed == []
+    pd.testing.assert_frame_equal(second, first)
+
+    with open(files[1], "a") as f:
+        f.write("changed\n")
+    third = checksums.checksum_files(files, manifest_path, workers=2, progress=False)
+    assert hashed == [files[1]]
+    assert third["md5"][1] == hashlib.md5(open(files[1], "rb").read()).hexdigest()
+    assert len(checksums.read_manifest(manifest_path)) == len(files)
+
+
+def test_checksum_files_resumes_an_interrupted_run(tmp_path, files, monkeypatch):
+    manifest_path = tmp_path / "manifest.csv"
+    counting_hash_entry(monkeypatch, fail_on=files[2])
+    with pytest.raises(Interrupted):
+        checksums.checksum_files(files, manifest_path, workers=1, progress=False)
+    assert set(checksums.read_manifest(manifest_path)) == set(files[:2]) # rows written as each file finished
+
+    hashed = counting_hash_entry(monkeypatch)
+    result = checksums.checksum_files(files, manifest_path, workers=1, progress=False)
+    assert hashed == files[2:]
+    assert result["path"].tolist() == files
+    header, rows = read_rows(manifest_path)
+    assert header == ["path", "size", "mtime", "md5", "sha256"]
+    assert sorted(row[0] for row in rows) == sorted(files) # rewritten without duplicates
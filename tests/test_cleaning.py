@@ -0,0 +1,68 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datatools.utils import cleaning
+
+
+def test_clean_frame_missing_values():
+    df = pd.DataFrame({"name": pd.Series(["  a  ", None, np.nan, pd.NA, "", "   ", "b c"], dtype=object)})
+    cleaned = cleaning.clean_frame(df)
+    assert cleaned["name"].dtype == cleaning.string_dtype
+    assert cleaned["name"].isna().tolist() == [False, True, True, True, True, True, False]
+    assert cleaned["name"].dropna().tolist() == ["a", "b c"]
+
+
+def test_clean_frame_leaves_other_columns_alone():
+    df = pd.DataFrame({
+        "text": [" x ", "y", None],
+        "int": [1, 2, 3],
+        "float": [1.5, np.nan, 3.0],
+        "bool": [True, False, True],
+        "date": pd.to_datetime(["2020-01-01", None, "2020-01-03"]),
+        "mixed": pd.Series([1, "a", None], dtype=object),
+        "string": pd.Series([" s ", None, ""], dtype="string"),
+    })
+    original = df.copy()
+    cleaned = cleaning.clean_frame(df)
+
+    assert cleaning.string_columns(df) == ["text", "string"]
+    for c in ["int", "float", "bool", "date", "mixed"]:
+        pd.testing.assert_series_equal(cleaned[c], df[c])
+    assert cleaned["text"].tolist() == ["x", "y", pd.NA]
+    assert cleaned["string"].tolist() == ["s", pd.NA, pd.NA]
+    pd.testing.assert_frame_equal(df, original) # not modified
+
+
+def test_clean_frame_explicit_non_string_columns():
+    df = pd.DataFrame({"int": pd.array([1, None, 3], dtype="Int64"), "float": [1.5, np.nan, 3.0]})
+    cleaned = cleaning.clean_frame(df, columns=["int", "float"])
+    assert cleaned["int"].tolist() == ["1", pd.NA, "3"]
+    assert cleaned["float"].tolist() == ["1.5", pd.NA, "3.0"]
+
+
+def test_remove_special_characters_matches_python():
+    values = ["a-b_c!", "tab\there", "nbsp em ", "next\x85line", "café", "(ID) 12", ""]
+    cleaned = cleaning.clean_series(pd.Series(values), ["remove_special_characters"])
+    assert cleaned.tolist() == [re.sub(r"[^a-zA-Z0-9\s]", "", v) for v in values]
+
+
+def test_clean_series_pipeline():
+    s = pd.Series(["  a   b  ", "\tc\n", None])
+    assert cleaning.clean_series(s, ["collapse_whitespace", "strip"]).tolist() == ["a b", "c", pd.NA]
+    assert cleaning.clean_series(s, [lambda x: x.str.upper()]).tolist() == ["  A   B  ", "\tC\n", pd.NA]
+    with pytest.raises(ValueError):
+        cleaning.clean_series(s, ["lowercase"])
+
+
+def test_clean_chunks_from_csv(tmp_path):
+    path = tmp_path / "export.csv"
+    names = [" a ", "", "  ", "b  c"] * 25
+    path.write_text("record_id,name,age\n" + "".join(f"{i},{name},{i % 7}\n" for i, name in enumerate(names)))
+    chunks = list(cleaning.clean_chunks(cleaning.read_csv_chunks(path, block_size=256)))
+    assert len(chunks) > 1
+    df = pd.concat(chunks, ignore_index=True)
+    assert df["name"].tolist() == ["a", pd.NA, pd.NA, "b  c"] * 25
+    assert df["record_id"].tolist() == list(range(100))
@@ -0,0 +1,85 @@
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from datatools import cli
+
+
+@pytest.mark.parametrize("argv, func, expected", [
+    (["harvest", "images"], cli.harvest,
+     {"root": "images", "output": ".", "workers": None, "full": False, "cache_dir": None, "no_progress": False, "strict": False}),
+    (["harvest", "images", "-o", "out", "--workers", "1", "--full", "--cache-dir", "c", "--no-progress", "--strict"], cli.harvest,
+     {"root": "images", "output": "out", "workers": 1, "full": True, "cache_dir": "c", "no_progress": True, "strict": True}),
+    (["geo", "200012345", "--pages", "-o", "samples.csv"], cli.geo_samples,
+     {"gds_id": "200012345", "pages": True, "output": "samples.csv"}),
+    (["zooma", "lung tissue", "CD4+ T cell", "--pem", "ebi.pem", "--no-cache", "--ttl", "60"], cli.zooma_annotate,
+     {"terms": ["lung tissue", "CD4+ T cell"], "pem": "ebi.pem", "no_cache": True, "ttl": 60.0, "output": None}),
+    (["redcap-export", "STUDY-001", "--token", "abc"], cli.redcap_export,
+     {"study_id": "STUDY-001", "token": "abc", "output": None}),
+    (["immport-validate", "template.xlsx", "--package", "pkg"], cli.immport_validate,
+     {"file_path": "template.xlsx", "package": "pkg", "config": ".env.secrets"}),
+    (["serve", "--socket", "/tmp/d.sock"], None, {"socket": "/tmp/d.sock"}),
+])
+def test_parse_subcommands(argv, func, expected, monkeypatch):
+    monkeypatch.delenv("DATATOOLS_SOCKET", raising=False)
+    args = cli.build_parser().parse_args(argv)
+    assert args.command == argv[0]
+    assert args.func is func
+    assert {k: getattr(args, k) for k in expected} == expected
+
+
+def test_parse_defaults_from_environment(monkeypatch):
+    monkeypatch.setenv("DATATOOLS_SOCKET", "/tmp/env.sock")
+    monkeypatch.setenv("DATATOOLS_ZOOMA_CACHE", "/tmp/zooma.sqlite")
+    args = cli.build_parser().parse_args(["zooma", "term"])
+    assert args.socket == "/tmp/env.sock"
+    assert args.cache == "/tmp/zooma.sqlite"
+
+    monkeypatch.delenv("DATATOOLS_ZOOMA_CACHE")
+    assert cli.build_parser().parse_args(["zooma", "term"]).cache == cli.default_zooma_cache
+
+
+def test_parse_errors():
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args([])
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(["immport-validate", "template.xlsx"]) # --package is required
+    with pytest.raises(ValueError):
+        cli.run(["serve"])
+
+
+def test_main_sends_the_command_to_the_socket(monkeypatch):
+    sent = []
+    monkeypatch.setattr(cli, "submit", lambda socket_path, argv: sent.append((socket_path, argv)) or 0)
+    assert cli.main(["--socket", "/tmp/d.sock", "redcap-export", "S1", "--token", "abc"]) == 0
+    assert sent == [("/tmp/d.sock", ["redcap-export", "S1", "--token", "abc"])]
+
+
+def test_redcap_export_needs_a_token(monkeypatch, capsys):
+    monkeypatch.delenv("REDCAP_TOKEN", raising=False)
+    assert cli.run(["redcap-export", "S1"]) == 2
+    assert "REDCAP_TOKEN" in capsys.readouterr().out
+
+
+@pytest.mark.skipif(not hasattr(socketserver, "UnixStreamServer"), reason="needs Unix domain sockets")
+def test_job_handler_round_trip(tmp_path, monkeypatch, capsys):
+    monkeypatch.delenv("REDCAP_TOKEN", raising=False)
+    socket_path = str(tmp_path / "datatools.sock")
+    server = socketserver.UnixStreamServer(socket_path, cli.job_handler)
+    server.clients = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        assert cli.submit(socket_path, ["redcap-export", "S1"]) == 2
+        assert "REDCAP_TOKEN" in capsys.readouterr().out
+        assert cli.submit(socket_path, ["not-a-command"]) == 2 # argparse exits with 2
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(socket_path)
+            s.sendall(b"not json\n")
+            assert b'"status": 2' in s.makefile("rb").readline()
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,42 @@
+import pytest
+
+from datatools.file_processing import flow
+
+
+def write_fcs(file_path, keywords: dict):
+    """ FCS 3.1 file with a HEADER and TEXT segment and no data """
+    text = ("/" + "".join(f"{k}/{v}/" for k, v in keywords.items())).encode()
+    start = 58
+    header = b"FCS3.1    " + f"{start:>8}{start + len(text) - 1:>8}{0:>8}{0:>8}{0:>8}{0:>8}".encode()
+    with open(file_path, "wb") as f:
+        f.write(header + text)
+
+
+def test_scan_fcs_directory_skips_unreadable_files(tmp_path):
+    for i in range(3):
+        write_fcs(tmp_path / f"s{i}.fcs", {"$FIL": f"s{i}.fcs", "$CYT": "Aurora", "$PAR": "2", "$P1N": "FSC-A", "$P2N": "CD4"})
+    (tmp_path / "garbage.fcs").write_bytes(b"not an fcs file")
+    (tmp_path / "empty.fcs").write_bytes(b"")
+    (tmp_path / "truncated.fcs").write_bytes(b"FCS3.1    ")
+    # a valid HEADER whose TEXT segment is past the end of the file
+    (tmp_path / "offsets.fcs").write_bytes(b"FCS3.1    " + b"%8d%8d" % (58, 200) + b"0" * 32)
+
+    experiment_df, reagents_df, errors_df = flow.scan_fcs_directory(tmp_path, workers=2)
+
+    assert len(experiment_df) == 3
+    assert sorted(reagents_df["File Name"]) == ["s0.fcs", "s1.fcs", "s2.fcs"]
+    assert sorted(p.rsplit("/", 1)[-1] for p in errors_df["Files"]) == ["empty.fcs", "garbage.fcs", "offsets.fcs", "truncated.fcs"]
+
+
+def test_read_fcs_keywords_with_no_readable_files(tmp_path):
+    (tmp_path / "garbage.fcs").write_bytes(b"not an fcs file")
+    keywords_df, errors_df = flow.read_fcs_keywords([str(tmp_path / "garbage.fcs"), str(tmp_path / "missing.fcs")])
+    assert len(keywords_df) == 0
+    assert len(errors_df) == 2
+
+
+def test_read_fcs_text_rejects_text_outside_the_file(tmp_path):
+    file_path = tmp_path / "offsets.fcs"
+    file_path.write_bytes(b"FCS3.1    " + b"%8d%8d" % (58, 200) + b"0" * 32)
+    with pytest.raises(ValueError, match="outside"):
+        flow.read_fcs_text(file_path)
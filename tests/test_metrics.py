@@ -0,0 +1,55 @@
+from datatools.file_processing import microscopy
+from datatools.utils import metrics
+from dev.bench_microscopy import write_lif
+
+
+def counter(snapshot: dict, name: str, **labels) -> float:
+    return sum(
+        c["value"] for c in snapshot["counters"]
+        if c["name"] == name and all(c["labels"].get(k) == v for k, v in labels.items())
+    )
+
+
+def histogram_count(snapshot: dict, name: str) -> int:
+    return sum(h["count"] for h in snapshot["histograms"] if h["name"] == name)
+
+
+def test_harvest_directory_merges_worker_metrics(tmp_path):
+    for i in range(4):
+        write_lif(tmp_path / f"image_{i}.lif", n_series=3, n_channels=2, depth=1)
+    (tmp_path / "broken.lif").write_bytes(b"not a lif file")
+
+    metrics.enable()
+    metrics.reset()
+    try:
+        md_df, channels_df, errors_df = microscopy.harvest_directory(tmp_path, workers=2, progress=False)
+        snapshot = metrics.metrics.to_dict()
+    finally:
+        metrics.reset()
+        metrics.enable(False)
+
+    assert len(errors_df) == 1
+    assert counter(snapshot, "files_parsed_total", kind="lif", status="ok") == 4
+    assert counter(snapshot, "files_parsed_total", kind="lif", status="error") == 1
+    assert histogram_count(snapshot, "file_parse_seconds") == 5
+    assert histogram_count(snapshot, "lif_channel_table_seconds") == 4
+    assert histogram_count(snapshot, "harvest_directory_seconds") == 1
+
+
+def test_isolated_snapshot_merge():
+    metrics.enable()
+    metrics.reset()
+    try:
+        metrics.inc("jobs_total")
+        with metrics.isolated() as worker:
+            metrics.inc("jobs_total", 2)
+            metrics.observe("job_seconds", 0.2)
+        assert counter(metrics.metrics.to_dict(), "jobs_total") == 1
+        metrics.merge(worker.snapshot())
+        snapshot = metrics.metrics.to_dict()
+    finally:
+        metrics.reset()
+        metrics.enable(False)
+
+    assert counter(snapshot, "jobs_total") == 3
+    assert histogram_count(snapshot, "job_seconds") == 1
@@ -0,0 +1,40 @@
+from unittest import mock
+
+import pytest
+
+from datatools.file_processing import microscopy
+from datatools.utils.cache import file_cache
+from dev.bench_microscopy import write_ims, write_lif
+
+
+def test_lif_file_processor_cache_hit_does_not_open_the_file(tmp_path):
+    lif_path = str(tmp_path / "image.lif")
+    write_lif(lif_path, n_series=3, n_channels=2, depth=1)
+    cache = file_cache(tmp_path / "cache")
+
+    first = microscopy.lif_file_processor(lif_path, metadata_only=True, cache=cache)
+    with mock.patch.object(microscopy, "read_lif_header", side_effect=AssertionError("file was opened")):
+        second = microscopy.lif_file_processor(lif_path, metadata_only=True, cache=cache)
+
+    assert len(second.md_df) == 3
+    assert second.md_df.astype(str).equals(first.md_df.astype(str))
+
+
+def test_ims_file_processor_metadata_extract(tmp_path):
+    ims_path = str(tmp_path / "image.ims")
+    write_ims(ims_path, n_channels=2)
+
+    metadata = microscopy.ims_file_processor.ims_metadata_extract(ims_path)
+
+    assert metadata == microscopy.ims_metadata_extract(ims_path)
+    assert metadata["dimensions"] == "64x64x4"
+
+
+@pytest.mark.parametrize("bins", [0, -4, 3])
+def test_get_pixel_stats_rejects_bins_that_are_not_a_power_of_two(tmp_path, bins):
+    lif_path = str(tmp_path / "image.lif")
+    write_lif(lif_path, n_series=1, n_channels=1, depth=1)
+    processor = microscopy.lif_file_processor(lif_path, metadata_only=True)
+    processor.metadata_only = False # the check comes before any image data is read
+    with pytest.raises(ValueError, match="power of two"):
+        processor.get_pixel_stats(bins=bins)
@@ -0,0 +1,85 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datatools.utils import profiling
+
+
+def hashes(values):
+    return pd.util.hash_pandas_object(pd.Series(values), index=False).to_numpy()
+
+
+@pytest.mark.parametrize("n", [10, 1000, 200_000])
+def test_hyperloglog_estimate(n):
+    sketch = profiling.hyperloglog(p=14)
+    sketch.update(hashes(np.arange(n)))
+    sketch.update(hashes(np.arange(n))) # repeats do not count
+    assert abs(sketch.estimate() - n) <= max(1, 0.03 * n)
+
+
+def test_hyperloglog_merge():
+    whole, first, second = profiling.hyperloglog(10), profiling.hyperloglog(10), profiling.hyperloglog(10)
+    whole.update(hashes(np.arange(5000)))
+    first.update(hashes(np.arange(3000)))
+    second.update(hashes(np.arange(2000, 5000)))
+    first.merge(second)
+    assert np.array_equal(first.registers, whole.registers)
+    with pytest.raises(ValueError):
+        first.merge(profiling.hyperloglog(12))
+
+
+def test_heavy_hitters_bounds():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([np.repeat(["a", "b", "c"], [5000, 3000, 1000]), rng.integers(0, 10_000, 20_000).astype(str)])
+    rng.shuffle(values)
+    truth = pd.Series(values).value_counts()
+
+    summary = profiling.heavy_hitters(capacity=20)
+    for chunk in np.array_split(values, 7):
+        summary.update(pd.Series(chunk).value_counts(sort=False))
+
+    assert summary.total == len(values)
+    assert len(summary.counters) <= 20
+    assert summary.error <= len(values) / 21
+    for value, count in summary.counters.items():
+        assert truth[value] - summary.error <= count <= truth[value]
+    assert [v for v, _ in summary.top(3)] == ["a", "b", "c"]
+
+
+def test_column_profiler_chunks_and_merge():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "id": np.arange(10_000),
+        "group": rng.choice(["x", "y", "z"], 10_000),
+        "value": np.where(rng.random(10_000) < 0.1, np.nan, rng.random(10_000)),
+        "tags": [["a", "b"] if i % 2 else ["c"] for i in range(10_000)], # unhashable
+    })
+    whole = profiling.profile(df, top=3)
+
+    first, second = profiling.column_profiler(top=3), profiling.column_profiler(top=3)
+    for chunk in np.array_split(np.arange(len(df)), 5):
+        (first if chunk[0] < 5000 else second).update(df.iloc[chunk])
+    merged = first.merge(second).report()
+
+    for report in (whole, merged):
+        assert report.loc["id", "count"] == 10_000
+        assert report.loc["value", "null_count"] == df["value"].isna().sum()
+        assert report.loc["value", "null_fraction"] == pytest.approx(df["value"].isna().mean())
+        assert abs(report.loc["id", "distinct_approx"] - 10_000) <= 300
+        assert report.loc["group", "distinct_approx"] == 3
+        assert dict(report.loc["group", "top_values"]) == df["group"].value_counts().to_dict()
+        assert report.loc["group", "top_error"] == 0
+        assert report.loc["tags", "distinct_approx"] == 2
+    assert whole.loc["value", "dtype"] == "float64"
+
+
+def test_column_profiler_json_report():
+    df = pd.DataFrame({"a": [1, 1, 2], "b": pd.to_datetime(["2020-01-01", None, "2020-01-01"])})
+    rows = json.loads(profiling.column_profiler(top=1).update(df).report(output="json"))
+    assert [r["column"] for r in rows] == ["a", "b"]
+    assert rows[0]["top_values"] == [[1, 2]]
+    assert rows[1]["null_count"] == 1
+    with pytest.raises(ValueError):
+        profiling.column_profiler().report(output="csv")
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datatools.utils import utils
+
+
+def old_mask(df):
+    """ What drop_duplicate_cols used before the hashed version """
+    return df.T.duplicated().to_numpy()
+
+
+mixed_frames = {
+    "numbers": pd.DataFrame({
+        "int": [1, 2, 3],
+        "Int64": pd.array([1, 2, 3], dtype="Int64"),
+        "float": [1.0, 2.0, 3.0],
+        "object": pd.Series([1, 2, 3], dtype=object),
+        "other": [1, 2, 4],
+    }),
+    "bools": pd.DataFrame({
+        "bool": [True, False, True],
+        "int": [1, 0, 1],
+        "object": pd.Series([True, False, True], dtype=object),
+    }),
+    "datetimes": pd.DataFrame({
+        "datetime": pd.to_datetime(["2020-01-01", "2020-01-02", "2020-01-03"]),
+        "object": pd.Series([pd.Timestamp("2020-01-01"), pd.Timestamp("2020-01-02"), pd.Timestamp("2020-01-03")], dtype=object),
+        "utc": pd.to_datetime(["2020-01-01", "2020-01-02", "2020-01-03"]).tz_localize("UTC"),
+        "berlin": pd.to_datetime(["2020-01-01", "2020-01-02", "2020-01-03"]).tz_localize("UTC").tz_convert("Europe/Berlin"),
+    }),
+    "strings": pd.DataFrame({
+        "object": pd.Series(["a", None, "b"], dtype=object),
+        "string": pd.Series(["a", None, "b"], dtype="string"),
+        "category": pd.Categorical(["a", None, "b"]),
+        "other": ["a", "c", "b"],
+    }),
+    "numbers with missing values": pd.DataFrame({
+        "Int64": pd.array([1, None, 3], dtype="Int64"),
+        "float": [1.0, np.nan, 3.0],
+        "other": [1.0, 2.0, np.nan],
+    }),
+}
+
+
+@pytest.mark.parametrize("name", mixed_frames)
+def test_duplicate_cols_mask_matches_transpose_for_mixed_dtypes(name):
+    df = mixed_frames[name]
+    assert utils.duplicate_cols_mask(df).tolist() == old_mask(df).tolist()
+
+
+def test_duplicate_cols_mask_chunks():
+    df = mixed_frames["numbers"]
+    assert utils.duplicate_cols_mask(df, chunk_rows=2).tolist() == old_mask(df).tolist()
+
+
+def test_duplicate_cols_mask_large_integers_stay_apart():
+    df = pd.DataFrame({
+        "a": [2**53, 1],
+        "b": [2**53 + 1, 1],
+        "Int64": pd.array([2**53 + 1, 1], dtype="Int64"),
+        "object": pd.Series([2**53 + 1, 1], dtype=object),
+    })
+    assert utils.duplicate_cols_mask(df).tolist() == old_mask(df).tolist() == [False, False, True, True]
+    assert utils.drop_duplicate_cols(df).columns.tolist() == ["a", "b"]
+
+
+def test_duplicate_cols_mask_negative_zero():
+    df = pd.DataFrame({"zero": [0.0, 1.0], "negative_zero": [-0.0, 1.0], "int": [0, 1]})
+    assert utils.duplicate_cols_mask(df).tolist() == old_mask(df).tolist() == [False, True, True]
+
+
+def test_drop_duplicate_cols_empty_frame():
+    df = pd.DataFrame({"a": pd.Series([], dtype="int64"), "b": pd.Series([], dtype=object), "c": pd.Series([], dtype=float)})
+    # df.T.duplicated() has no rows to return here, so the old df.loc[:, ~mask] raised an IndexingError
+    assert old_mask(df).tolist() == []
+    assert utils.duplicate_cols_mask(df).tolist() == [False, False, False]
+    assert utils.drop_duplicate_cols(df).columns.tolist() == ["a", "b", "c"]
+    assert utils.duplicate_cols_mask(pd.DataFrame()).tolist() == []
+
+
+def test_group_join_unique_categorical_keys():
+    df = pd.DataFrame({
+        "study": pd.Categorical(["s1", "s1", "s2", "s1"], categories=["s1", "s2", "unused"]),
+        "arm": pd.Categorical(["a", "b", "a", "a"]),
+        "sample": ["x", "y", "z", "x"],
+    })
+    expected = df.groupby(["study", "arm"], observed=True)["sample"].agg(lambda s: ",".join(dict.fromkeys(s)))
+
+    result = utils.group_join_unique(df, ["study", "arm"])
+
+    assert result["sample"].to_dict() == expected.to_dict()
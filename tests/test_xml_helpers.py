@@ -0,0 +1,166 @@
+import io
+import sys
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from datatools.utils import xml_helpers
+
+document = """
+<Root version="2">
+    <Header><Name>run 1</Name><Date>2024-01-01</Date></Header>
+    <Keywords>
+        <Keyword name="$CYT" value="Aurora"/>
+        <Keyword name="$FIL">s1.fcs</Keyword>
+        <Keyword name="$PAR">12</Keyword>
+    </Keywords>
+    <Samples>
+        <Sample id="1"><Keywords><Keyword name="TUBE">A1</Keyword></Keywords>first</Sample>
+        <Sample id="2"><Empty/><Note>  spaced  </Note></Sample>
+    </Samples>
+</Root>
+"""
+
+
+def old_parse_element(element):
+    """ parse_element before it was made iterative """
+    parsed_dict = {}
+    if element.attrib:
+        parsed_dict.update(element.attrib)
+    for child in element:
+        child_dict = old_parse_element(child)
+        if child.tag in parsed_dict:
+            if not isinstance(parsed_dict[child.tag], list):
+                parsed_dict[child.tag] = [parsed_dict[child.tag]]
+            parsed_dict[child.tag].append(child_dict)
+        else:
+            parsed_dict[child.tag] = child_dict
+    if element.text and element.text.strip():
+        parsed_dict["text"] = element.text.strip()
+    return parsed_dict
+
+
+def nested(depth: int) -> ET.Element:
+    root = ET.Element("Level", depth="0")
+    element = root
+    for d in range(1, depth):
+        element = ET.SubElement(element, "Level", depth=str(d))
+    element.text = "bottom"
+    return root
+
+
+def test_parse_element_matches_recursive_version():
+    root = ET.fromstring(document)
+    result = xml_helpers.parse_element(root)
+    assert result == old_parse_element(root)
+    assert list(result) == list(old_parse_element(root)) # attributes, children, then text
+
+
+def test_parse_element_deep_nesting():
+    root = nested(200)
+    assert xml_helpers.parse_element(root) == old_parse_element(root)
+
+    depth = sys.getrecursionlimit() + 100
+    parsed = xml_helpers.parse_element(nested(depth))
+    for _ in range(depth - 1):
+        parsed = parsed["Level"]
+    assert parsed == {"depth": str(depth - 1), "text": "bottom"}
+
+
+def test_parse_element_keep():
+    root = ET.fromstring(document)
+    old = old_parse_element(root)
+
+    assert xml_helpers.parse_element(root, keep={"Header"}) == {"Header": old["Header"]}
+    # a tag is kept anywhere, a path only from the element
+    assert xml_helpers.parse_element(root, keep={"Keyword"}) == {
+        "Keywords": {"Keyword": old["Keywords"]["Keyword"]},
+        "Samples": {"Sample": {"Keywords": {"Keyword": {"name": "TUBE", "text": "A1"}}}},
+    }
+    assert xml_helpers.parse_element(root, keep={"Keywords/Keyword"}) == {"Keywords": {"Keyword": old["Keywords"]["Keyword"]}}
+    assert xml_helpers.parse_element(root, keep={"Root"}) == old
+    assert xml_helpers.parse_element(root, keep={"Missing"}) == {}
+
+
+def test_parse_element_compact():
+    root = ET.fromstring(document)
+    result = xml_helpers.parse_element(root, compact=True)
+    assert result["Header"] == {"Name": "run 1", "Date": "2024-01-01"}
+    assert result["Keywords"]["Keyword"][0] == {"name": "$CYT", "value": "Aurora"}
+    assert result["Samples"]["Sample"][1] == {"id": "2", "Empty": {}, "Note": "spaced"}
+    assert xml_helpers.parse_element(root, keep={"Header"}, compact=True) == {"Header": {"Name": "run 1", "Date": "2024-01-01"}}
+
+
+def test_parse_element_intern_keys():
+    root = ET.fromstring(document)
+    assert xml_helpers.parse_element(root, intern_keys=True) == old_parse_element(root)
+
+
+def chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_iter_xml_records_chunked(tmp_path, chunk_size):
+    data = document.replace("run 1", "run 1 \u00b5m").encode("utf-8") # multi-byte characters split across chunks
+    root = ET.fromstring(data)
+    expected = [xml_helpers.parse_element(e) for e in root.findall("Samples/Sample")]
+    path = tmp_path / "document.xml"
+    path.write_bytes(data)
+
+    assert list(xml_helpers.iter_xml_records(path, "Root/Samples/Sample", chunk_size=chunk_size)) == expected
+    assert list(xml_helpers.iter_xml_records(io.BytesIO(data), "/Root/Samples/Sample", chunk_size=chunk_size)) == expected
+    assert list(xml_helpers.iter_xml_records(chunks(data, chunk_size), "Root/Samples/Sample")) == expected
+
+
+def test_iter_xml_records_only_yields_the_record_path():
+    data = document.encode("utf-8")
+    root = ET.fromstring(data)
+    # the Keyword inside a Sample is not at Root/Keywords/Keyword
+    records = list(xml_helpers.iter_xml_records(chunks(data, 5), "Root/Keywords/Keyword", compact=True))
+    assert records == [xml_helpers.parse_element(e, compact=True) for e in root.findall("Keywords/Keyword")]
+    assert len(records) == 3
+
+
+def all_paths(element, path=()):
+    """ (path, element) for every element, in document order """
+    path = path + (element.tag,)
+    yield path, element
+    for child in element:
+        yield from all_paths(child, path)
+
+
+def test_find_paths_queries():
+    root = ET.fromstring("<Root><A><B/><C><B/></C></A><B><A/></B></Root>")
+    queries = ["B", "*", "A/*", "*/B", "/Root/B", "/Root/*", "/A", "C/B", "Missing"]
+    found = xml_helpers.find_paths(root, queries)
+
+    def paths(query):
+        return [p for p, _ in found[query]]
+
+    everything = [p for p, _ in all_paths(root)]
+    assert paths("*") == everything
+    assert paths("B") == [("Root", "A", "B"), ("Root", "A", "C", "B"), ("Root", "B")]
+    assert paths("A/*") == [("Root", "A", "B"), ("Root", "A", "C")]
+    assert paths("*/B") == paths("B")
+    assert paths("/Root/B") == [("Root", "B")]
+    assert paths("/Root/*") == [("Root", "A"), ("Root", "B")]
+    assert paths("/A") == [] # anchored at the element the search starts from
+    assert paths("C/B") == [("Root", "A", "C", "B")]
+    assert paths("Missing") == []
+    # the elements are the ones at those paths
+    elements = dict((p, e) for p, e in all_paths(root))
+    assert all(elements[p] is e for query in queries for p, e in found[query])
+
+
+def test_find_paths_join_and_single_query():
+    root = ET.fromstring("<Root><A><B/></A></Root>")
+    assert [p for p, _ in xml_helpers.find_paths(root, "B", join=True)["B"]] == ["/Root/A/B"]
+    assert [p for p, _ in xml_helpers.find_paths(root[0], "/A/B")["/A/B"]] == [("A", "B")]
+
+
+def test_compile_query():
+    assert xml_helpers.compile_query("/Root/A/") == (True, ("Root", "A"))
+    assert xml_helpers.compile_query("A/*") == (False, ("A", "*"))
+    with pytest.raises(ValueError):
+        xml_helpers.compile_query("/")
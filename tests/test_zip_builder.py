@@ -0,0 +1,78 @@
+import hashlib
+import os
+import threading
+import zipfile
+
+import pytest
+
+from datatools.utils import zip_builder
+
+
+@pytest.fixture
+def files(tmp_path):
+    """ Compressible text, incompressible bytes and a .tif that is stored by extension """
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"table_{i}.csv"
+        path.write_text("sample,value\n" * (2000 * (i + 1)))
+        paths.append(path)
+    for i in range(3):
+        path = tmp_path / f"random_{i}.bin"
+        path.write_bytes(os.urandom(50_000 * (i + 1)))
+        paths.append(path)
+    tif = tmp_path / "image.tif"
+    tif.write_bytes(os.urandom(30_000))
+    return [str(p) for p in paths + [tif]]
+
+
+def check_archive(output_zip, files, members_df):
+    with zipfile.ZipFile(output_zip) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [os.path.basename(f) for f in files]
+        for path in files:
+            with open(path, "rb") as f:
+                assert zf.read(os.path.basename(path)) == f.read()
+    md5 = {os.path.basename(f): hashlib.md5(open(f, "rb").read()).hexdigest() for f in files}
+    assert dict(zip(members_df["name"], members_df["md5"])) == md5
+
+
+def test_build_zip(tmp_path, files):
+    output_zip = tmp_path / "out.zip"
+    # a budget smaller than some of the files, so both writing paths are used
+    members_df = zip_builder.build_zip(files, output_zip, workers=3, max_buffered=100_000,
+                                       manifest_path=tmp_path / "manifest.csv", progress=False)
+    check_archive(output_zip, files, members_df)
+    assert set(members_df["compress_type"]) == {"deflate", "store"}
+
+
+def test_build_zip_without_raw_writes(tmp_path, files, monkeypatch):
+    monkeypatch.setattr(zip_builder, "RAW_WRITES", False)
+    monkeypatch.setattr(zip_builder, "_write_compressed", None)
+    output_zip = tmp_path / "out.zip"
+    members_df = zip_builder.build_zip(files, output_zip, workers=3, manifest_path=tmp_path / "manifest.csv", progress=False)
+    check_archive(output_zip, files, members_df)
+
+
+def test_build_zip_buffered_bytes_stay_in_budget(tmp_path, files, monkeypatch):
+    lock = threading.Lock()
+    live = {"bytes": 0, "max": 0}
+    read_member, write_compressed = zip_builder._read_member, zip_builder._write_compressed
+
+    def counting_read(file_path, *args):
+        with lock:
+            live["bytes"] += os.path.getsize(file_path)
+            live["max"] = max(live["max"], live["bytes"])
+        return read_member(file_path, *args)
+
+    def counting_write(zf, zinfo, *args):
+        write_compressed(zf, zinfo, *args)
+        with lock:
+            live["bytes"] -= zinfo.file_size
+
+    monkeypatch.setattr(zip_builder, "_read_member", counting_read)
+    monkeypatch.setattr(zip_builder, "_write_compressed", counting_write)
+    max_buffered = 120_000
+    members_df = zip_builder.build_zip(files, tmp_path / "out.zip", workers=4, window=8,
+                                       max_buffered=max_buffered, progress=False)
+    assert len(members_df) == len(files)
+    assert 0 < live["max"] <= max_buffered